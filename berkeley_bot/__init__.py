@@ -1,5 +1,6 @@
 """Berkeley course enrollment Discord bot package."""
 
+from .timeline import TIMELINE  # noqa: F401  (starts the startup clock first)
 from .bot import create_bot
 
 __all__ = ["create_bot"]
@@ -0,0 +1,217 @@
+"""Admission control for student-facing enroll, drop and register actions.
+
+Every action passes through one :class:`AdmissionController` before it
+touches Discord:
+
+* a per-user token bucket charges one token per course (one per
+  registration), so a user who fires off 20-course forms back to back is
+  slowed down without affecting anyone else;
+* a global ceiling bounds how many actions run at once, which keeps the
+  shared Discord API budget available to everyone;
+* excess actions wait in a bounded FIFO queue, at most one per user, and
+  are told their position while they wait.
+
+A request that is over its user's budget, or that arrives while the queue
+is full, raises :class:`AdmissionDenied` with a retry-after hint instead of
+waiting.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import math
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Set
+
+import discord
+
+
+DEFAULT_USER_RATE = 0.2
+DEFAULT_USER_BURST = 20
+DEFAULT_MAX_ACTIVE = 8
+DEFAULT_MAX_QUEUE = 100
+# How often a queued request re-checks its position.
+POSITION_INTERVAL = 2.0
+# Idle buckets are pruned once this many users have been seen.
+MAX_BUCKETS = 10_000
+
+QueueCallback = Callable[[int], Awaitable[None]]
+
+
+class AdmissionDenied(Exception):
+    """Raised when a request is rejected; ``retry_after`` is in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, tokens: float, stamp: float):
+        self.tokens = tokens
+        self.stamp = stamp
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        *,
+        user_rate: float = DEFAULT_USER_RATE,
+        user_burst: int = DEFAULT_USER_BURST,
+        max_active: int = DEFAULT_MAX_ACTIVE,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+    ):
+        self.user_rate = user_rate
+        self.user_burst = float(user_burst)
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self._buckets: Dict[int, _Bucket] = {}
+        self._waiting: Deque[asyncio.Future] = deque()
+        self._waiting_users: Set[int] = set()
+        # Smoothed seconds per admitted action, for retry-after estimates.
+        self._service = 2.0
+
+    # ------------ per-user budget ------------
+    def _charge(self, user_id: int, cost: float) -> None:
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            bucket = self._buckets[user_id] = _Bucket(self.user_burst, now)
+        bucket.tokens = min(self.user_burst, bucket.tokens + (now - bucket.stamp) * self.user_rate)
+        bucket.stamp = now
+        # A request larger than the burst would never fit; it needs a full bucket instead.
+        cost = min(cost, self.user_burst)
+        if bucket.tokens < cost:
+            self.rejected += 1
+            retry = (cost - bucket.tokens) / self.user_rate
+            raise AdmissionDenied(f"⏳ You're going a bit fast. Try again in {math.ceil(retry)}s.", retry)
+        bucket.tokens -= cost
+
+    def _refund(self, user_id: int, cost: float) -> None:
+        bucket = self._buckets.get(user_id)
+        if bucket is not None:
+            bucket.tokens = min(self.user_burst, bucket.tokens + min(cost, self.user_burst))
+
+    def _prune(self, now: float) -> None:
+        full = [
+            uid for uid, b in self._buckets.items()
+            if b.tokens + (now - b.stamp) * self.user_rate >= self.user_burst
+        ]
+        for uid in full:
+            del self._buckets[uid]
+
+    # ------------ global ceiling ------------
+    @contextlib.asynccontextmanager
+    async def admit(
+        self,
+        user_id: int,
+        *,
+        cost: float = 1,
+        on_queued: Optional[QueueCallback] = None,
+    ) -> AsyncIterator[None]:
+        """Hold one of the ``max_active`` slots for the duration of the block.
+
+        ``on_queued(position)`` is awaited whenever a waiting request's
+        1-based queue position changes.
+        """
+        self._charge(user_id, cost)
+        if self.active < self.max_active and not self._waiting:
+            self.active += 1
+        else:
+            try:
+                await self._wait(user_id, on_queued)
+            except AdmissionDenied:
+                self._refund(user_id, cost)
+                raise
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service = 0.8 * self._service + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    async def _wait(self, user_id: int, on_queued: Optional[QueueCallback]) -> None:
+        if user_id in self._waiting_users:
+            self.rejected += 1
+            retry = self._estimate(len(self._waiting))
+            raise AdmissionDenied(
+                f"⏳ You already have a request waiting. Try again in {math.ceil(retry)}s.", retry
+            )
+        if len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            retry = self._estimate(len(self._waiting))
+            raise AdmissionDenied(f"⏳ The bot is busy right now. Try again in {math.ceil(retry)}s.", retry)
+
+        ticket = asyncio.get_running_loop().create_future()
+        self._waiting.append(ticket)
+        self._waiting_users.add(user_id)
+        self.queued += 1
+        reported = 0
+        try:
+            while not ticket.done():
+                position = self._waiting.index(ticket) + 1
+                if on_queued is not None and position != reported:
+                    reported = position
+                    try:
+                        await on_queued(position)
+                    except discord.HTTPException:
+                        pass
+                await asyncio.wait([ticket], timeout=POSITION_INTERVAL)
+        except BaseException:
+            if ticket.done() and not ticket.cancelled():
+                # The slot was handed to us just as we gave up; pass it on.
+                self._release()
+            else:
+                ticket.cancel()
+                with contextlib.suppress(ValueError):
+                    self._waiting.remove(ticket)
+            raise
+        finally:
+            self._waiting_users.discard(user_id)
+
+    def _release(self) -> None:
+        # Hand the slot straight to the oldest waiter so nobody can jump the queue.
+        while self._waiting:
+            ticket = self._waiting.popleft()
+            if not ticket.done():
+                ticket.set_result(None)
+                return
+        self.active -= 1
+
+    def _estimate(self, ahead: int) -> float:
+        return max(1.0, (ahead + 1) * self._service / max(1, self.max_active))
+
+    def report(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "max_active": self.max_active,
+            "waiting": len(self._waiting),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "service_s": round(self._service, 2),
+        }
+
+
+def queue_notice(interaction: discord.Interaction) -> QueueCallback:
+    """``on_queued`` callback that shows the queue position in the interaction's reply."""
+
+    async def notify(position: int) -> None:
+        text = f"⏳ Lots of requests right now — you're #{position} in line."
+        if not interaction.response.is_done():
+            await interaction.response.defer(ephemeral=True, thinking=True)
+        await interaction.edit_original_response(content=text)
+
+    return notify
@@ -0,0 +1,115 @@
+"""Compressed, read-only archives of past terms.
+
+When the term rolls over, :meth:`DataStore.rollover` moves every other term's
+enrollments and course index entries out of the hot JSON files into
+``archive/<term>.json.gz``. The archive keeps the same JSON shapes as the hot
+documents, and it is parsed into its own compact tables only when a past term
+is queried.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import pathlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .compact import CourseIndexTable, EnrollmentTable, SlugTable
+
+SUFFIX = ".json.gz"
+# Parsed archives kept in memory; admins rarely look at more than one or two past terms.
+CACHE_SIZE = 2
+
+
+def archive_path(directory: pathlib.Path, term: str) -> pathlib.Path:
+    return directory / f"{term.lower()}{SUFFIX}"
+
+
+def write_archive(path: pathlib.Path, term: str, enrollments: dict, course_index: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"term": term, "enrollments": enrollments, "course_index": course_index}
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        json.dump(payload, fh, separators=(",", ":"))
+    tmp.replace(path)
+
+
+def read_archive(path: pathlib.Path) -> dict:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+class TermArchive:
+    """One past term, parsed into compact tables."""
+
+    __slots__ = ("term", "signature", "enrollments", "index")
+
+    def __init__(self, term: str, signature: Tuple[int, int, int], data: dict):
+        slugs = SlugTable()
+        self.term = term
+        self.signature = signature
+        self.enrollments = EnrollmentTable.from_json(data.get("enrollments", {}), slugs)
+        self.index = CourseIndexTable.from_json(data.get("course_index", {}), slugs)
+
+
+class ArchiveShelf:
+    """The archive directory: which terms are archived, plus a small LRU of parsed archives."""
+
+    def __init__(self, directory: pathlib.Path):
+        self.directory = directory
+        self._cache: "OrderedDict[str, TermArchive]" = OrderedDict()
+        self._listing: Optional[Tuple[int, List[str]]] = None
+
+    def terms(self) -> List[str]:
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if self._listing is None or self._listing[0] != mtime:
+            names = sorted(p.name[: -len(SUFFIX)] for p in self.directory.glob(f"*{SUFFIX}"))
+            self._listing = (mtime, names)
+        return self._listing[1]
+
+    def has(self, term: str) -> bool:
+        return term.lower() in self.terms()
+
+    def get(self, term: str) -> Optional[TermArchive]:
+        term = term.lower()
+        path = archive_path(self.directory, term)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._cache.pop(term, None)
+            return None
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        archive = self._cache.get(term)
+        if archive is None or archive.signature != signature:
+            archive = TermArchive(term, signature, read_archive(path))
+            self._cache[term] = archive
+        self._cache.move_to_end(term)
+        while len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return archive
+
+    def write(self, term: str, enrollments: Dict[str, list], course_index: Dict[str, dict]) -> None:
+        """Merge into any existing archive for ``term`` and rewrite it."""
+        path = archive_path(self.directory, term)
+        existing = read_archive(path)
+        merged_enrollments = existing.get("enrollments", {})
+        for uid, slugs in enrollments.items():
+            merged_enrollments[uid] = list(dict.fromkeys([*merged_enrollments.get(uid, []), *slugs]))
+        merged_index = {**existing.get("course_index", {}), **course_index}
+        write_archive(path, term, merged_enrollments, merged_index)
+        self._cache.pop(term, None)
+
+    def read(self, term: str) -> dict:
+        return read_archive(archive_path(self.directory, term))
+
+    def remove(self, term: str) -> None:
+        archive_path(self.directory, term).unlink(missing_ok=True)
+        self._cache.pop(term.lower(), None)
@@ -0,0 +1,225 @@
+"""Memory-mapped binary course index.
+
+Layout of ``course_index.bin``::
+
+    header   32 bytes   magic, sorted record count, reserved
+    sorted   N * 24     (slug hash, container_id, thread_id), ordered by hash
+    append   M * 24     same records, in write order; later entries win
+
+Lookups binary-search the sorted region through ``mmap`` and scan the small
+append region, so opening the file and looking a slug up cost the same no
+matter how many terms the index has accumulated. Once the append region grows
+past ``append_limit`` records, everything is merged into a fresh sorted file.
+
+Hashes are one-way, so slug names are kept in a sidecar ``.slugs`` text file
+(one per line). It is only read when converting back to JSON.
+
+Run ``python -m berkeley_bot.binindex to-binary|to-json SRC DST`` to convert.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"BBIDX1\x00\x00"
+HEADER = struct.Struct("<8sQ16x")
+RECORD = struct.Struct("<QQQ")
+DEFAULT_APPEND_LIMIT = 256
+
+
+def slug_hash(slug: str) -> int:
+    return int.from_bytes(hashlib.blake2b(slug.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def slugs_path_for(path: pathlib.Path) -> pathlib.Path:
+    return path.with_suffix(path.suffix + ".slugs")
+
+
+class BinaryCourseIndex:
+    """Read-mostly slug -> (container_id, thread_id) map backed by ``mmap``.
+
+    Callers serialise writers themselves (``DataStore`` holds the file lock);
+    readers remap whenever the file on disk has changed.
+    """
+
+    def __init__(self, path: pathlib.Path, *, append_limit: int = DEFAULT_APPEND_LIMIT):
+        self.path = path
+        self._append_limit = append_limit
+        self._map: Optional[mmap.mmap] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._sorted = 0
+        self._total = 0
+        if not path.exists():
+            _write_index(path, {}, [])
+
+    # ------------ mapping ------------
+    def _current_signature(self) -> Tuple[int, int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _ensure_mapped(self) -> None:
+        signature = self._current_signature()
+        if self._map is not None and signature == self._signature:
+            return
+        self.close()
+        with self.path.open("rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, sorted_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a course index file")
+        self._sorted = sorted_count
+        self._total = (len(self._map) - HEADER.size) // RECORD.size
+        self._signature = signature
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _record(self, i: int) -> Tuple[int, int, int]:
+        return RECORD.unpack_from(self._map, HEADER.size + i * RECORD.size)
+
+    # ------------ queries ------------
+    def __len__(self) -> int:
+        return sum(1 for _ in self._latest())
+
+    def get(self, slug: str) -> Optional[Tuple[int, int]]:
+        self._ensure_mapped()
+        key = slug_hash(slug)
+        for i in range(self._total - 1, self._sorted - 1, -1):
+            h, container_id, thread_id = self._record(i)
+            if h == key:
+                return container_id, thread_id
+        lo, hi = 0, self._sorted
+        while lo < hi:
+            mid = (lo + hi) // 2
+            h, container_id, thread_id = self._record(mid)
+            if h < key:
+                lo = mid + 1
+            elif h > key:
+                hi = mid
+            else:
+                return container_id, thread_id
+        return None
+
+    def _latest(self) -> Iterator[Tuple[int, int, int]]:
+        self._ensure_mapped()
+        latest: Dict[int, Tuple[int, int]] = {}
+        for i in range(self._total):
+            h, container_id, thread_id = self._record(i)
+            latest[h] = (container_id, thread_id)
+        for h, (container_id, thread_id) in latest.items():
+            yield h, container_id, thread_id
+
+    def items(self) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        """Yield ``(slug, (container_id, thread_id))`` for every named entry."""
+        names = {slug_hash(slug): slug for slug in self._slug_names()}
+        for h, container_id, thread_id in self._latest():
+            if h in names:
+                yield names[h], (container_id, thread_id)
+
+    def _slug_names(self) -> Iterator[str]:
+        try:
+            with slugs_path_for(self.path).open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if line:
+                        yield line
+        except FileNotFoundError:
+            return
+
+    # ------------ writes ------------
+    def put(self, slug: str, container_id: int, thread_id: int) -> None:
+        is_new = self.get(slug) is None
+        with self.path.open("ab") as fh:
+            fh.write(RECORD.pack(slug_hash(slug), int(container_id), int(thread_id)))
+        if is_new:
+            with slugs_path_for(self.path).open("a", encoding="utf-8") as fh:
+                fh.write(slug + "\n")
+        self._ensure_mapped()
+        if self._total - self._sorted > self._append_limit:
+            self.rebuild()
+
+    def remove(self, slugs: Iterable[str]) -> None:
+        """Drop ``slugs`` and rewrite the file sorted."""
+        gone = set(slugs)
+        hashes = {slug_hash(slug) for slug in gone}
+        entries = {h: (c, t) for h, c, t in self._latest() if h not in hashes}
+        names = [name for name in dict.fromkeys(self._slug_names()) if name not in gone]
+        self._write_sorted(entries, names)
+
+    def rebuild(self) -> None:
+        """Merge the append region into a new sorted file."""
+        entries = {h: (c, t) for h, c, t in self._latest()}
+        names = list(dict.fromkeys(self._slug_names()))
+        self._write_sorted(entries, names)
+
+    def _write_sorted(self, entries: Dict[int, Tuple[int, int]], names: List[str]) -> None:
+        self.close()
+        _write_index(self.path, entries, names)
+
+    @classmethod
+    def from_mapping(
+        cls, path: pathlib.Path, mapping: Dict[str, Tuple[int, int]], **kwargs
+    ) -> "BinaryCourseIndex":
+        entries = {slug_hash(slug): (int(c), int(t)) for slug, (c, t) in mapping.items()}
+        _write_index(path, entries, list(mapping))
+        return cls(path, **kwargs)
+
+
+def _write_index(path: pathlib.Path, entries: Dict[int, Tuple[int, int]], names: List[str]) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("wb") as fh:
+        fh.write(HEADER.pack(MAGIC, len(entries)))
+        for h in sorted(entries):
+            fh.write(RECORD.pack(h, *entries[h]))
+    slugs_tmp = slugs_path_for(path).with_suffix(".slugs.tmp")
+    slugs_tmp.write_text("".join(f"{name}\n" for name in names), encoding="utf-8")
+    slugs_tmp.replace(slugs_path_for(path))
+    tmp.replace(path)
+
+
+# ------------ JSON conversion ------------
+def json_to_binary(src: pathlib.Path, dst: pathlib.Path) -> int:
+    with src.open("r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    mapping = {slug: (raw["container_id"], raw["thread_id"]) for slug, raw in data.items()}
+    BinaryCourseIndex.from_mapping(dst, mapping).close()
+    return len(mapping)
+
+
+def binary_to_json(src: pathlib.Path, dst: pathlib.Path) -> int:
+    index = BinaryCourseIndex(src)
+    try:
+        data = {
+            slug: {"container_id": container_id, "thread_id": thread_id}
+            for slug, (container_id, thread_id) in index.items()
+        }
+    finally:
+        index.close()
+    tmp = dst.with_suffix(dst.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    tmp.replace(dst)
+    return len(data)
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Convert the course index between JSON and binary.")
+    parser.add_argument("direction", choices=["to-binary", "to-json"])
+    parser.add_argument("src", type=pathlib.Path)
+    parser.add_argument("dst", type=pathlib.Path)
+    args = parser.parse_args(argv)
+    convert = json_to_binary if args.direction == "to-binary" else binary_to_json
+    count = convert(args.src, args.dst)
+    print(f"Wrote {count} entries to {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
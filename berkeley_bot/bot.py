@@ -9,29 +9,44 @@ from discord.ext import commands
 
 from .commands import register_commands
 from .config import BotConfig, load_config
-from .enrollment import EnrollmentService
-from .registration import RegistrationService
-from .storage import DataStore
+from .leader import LeaderElection
+from .members import MemberCache
+from .tenancy import TenantRegistry
+from .timeline import TIMELINE
 
 
 def create_bot() -> tuple[commands.Bot, BotConfig]:
+    TIMELINE.mark("import")
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s %(levelname)-8s %(name)s %(message)s",
     )
 
     config = load_config()
+    TIMELINE.mark("config")
 
     intents = discord.Intents.default()
     intents.guilds = True
     intents.members = True
-
-    bot = commands.Bot(command_prefix="!", intents=intents)
-
-    store = DataStore(config.paths)
-    registration = RegistrationService(store, config)
-    enrollment = EnrollmentService(store, private_containers=config.private_containers)
-
-    register_commands(bot, config, store, registration, enrollment)
+    members = MemberCache(config.member_cache_mode, recent_size=config.member_cache_recent)
+
+    if config.shard_count is None:
+        bot = commands.Bot(command_prefix="!", intents=intents, **members.client_options())
+    else:
+        # Several processes may each run a slice of the shards (SHARD_IDS); they
+        # share the data directory through the store's file locks.
+        bot = commands.AutoShardedBot(
+            command_prefix="!",
+            intents=intents,
+            shard_count=config.shard_count or None,
+            shard_ids=list(config.shard_ids) if config.shard_ids else None,
+            **members.client_options(),
+        )
+
+    tenants = TenantRegistry(config)
+    leader = LeaderElection(config.leader_lock)
+    TIMELINE.mark("services")
+
+    register_commands(bot, config, tenants, leader, members)
     return bot, config
 
@@ -0,0 +1,425 @@
+"""Admin bulk jobs that touch many members or courses at once.
+
+Jobs fan work out over a small worker pool and draw every Discord call from a
+shared :class:`TokenBucket`, so a run over thousands of students stays well
+inside the API rate limits instead of leaning on 429 retries.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import logging
+import pathlib
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+
+import discord
+
+from . import courses, state
+from .courses import CourseKey
+from .enrollment import EnrollmentService
+from .members import MemberCache
+from .registration import RegistrationService
+from .resilience import CircuitOpenError, call
+from .storage import DataStore
+
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_CONCURRENCY = 4
+# Member edits share a per-guild bucket; about 5/s leaves room for normal traffic.
+DEFAULT_RATE = 5.0
+
+
+class TokenBucket:
+    """Async token bucket: ``take()`` waits until a call fits the budget."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+
+    async def take(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def run_bounded(
+    items: Iterable[T],
+    worker: Callable[[T], Awaitable[None]],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    budget: Optional[TokenBucket] = None,
+) -> None:
+    """Run ``worker`` over ``items`` with at most ``concurrency`` in flight."""
+    iterator = iter(items)
+
+    async def drain() -> None:
+        for item in iterator:
+            if budget is not None:
+                await budget.take()
+            await worker(item)
+
+    await asyncio.gather(*(drain() for _ in range(max(1, concurrency))))
+
+
+class ProgressReporter:
+    """Calls ``send(text)`` at most once per ``interval`` seconds, plus a final update.
+
+    An update that arrives too soon isn't lost: the latest one is sent when
+    the interval ends (trailing edge), unless a newer send supersedes it.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], *, interval: float = 2.0):
+        self._send = send
+        self._interval = interval
+        self._last = 0.0
+        self._pending: Optional[str] = None
+        self._trailing: Optional[asyncio.Task] = None
+
+    async def update(self, text: str, *, final: bool = False) -> None:
+        now = time.monotonic()
+        if not final and now - self._last < self._interval:
+            self._pending = text
+            if self._trailing is None or self._trailing.done():
+                self._trailing = asyncio.create_task(self._flush_after(self._last + self._interval - now))
+            return
+        await self._cancel_trailing()
+        await self._emit(text)
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        text, self._pending = self._pending, None
+        if text is not None:
+            await self._emit(text)
+
+    async def _cancel_trailing(self) -> None:
+        task, self._trailing = self._trailing, None
+        self._pending = None
+        if task is not None and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    async def _emit(self, text: str) -> None:
+        self._last = time.monotonic()
+        try:
+            await self._send(text)
+        except discord.HTTPException:
+            # Interaction tokens expire after 15 minutes; progress is best effort.
+            log.debug("Progress update failed", exc_info=True)
+
+
+# -------------------- Student role sync --------------------
+
+@dataclass
+class RoleSyncResult:
+    action: str
+    total: int = 0
+    changed: int = 0
+    failed: List[int] = field(default_factory=list)
+
+    def summary(self) -> str:
+        verb = "Granted" if self.action == "grant" else "Revoked"
+        text = f"{verb} {self.changed}/{self.total}"
+        if self.failed:
+            text += f" · {len(self.failed)} failed (run again to retry)"
+        return text
+
+
+class RoleSyncJob:
+    """Bring the student role in line with ``users.json``.
+
+    ``grant`` adds the role to registered members who lack it; ``revoke``
+    removes it from members who are not registered. The diff comes from the
+    member cache, and every uid handled is checkpointed, so an interrupted
+    run picks up where it stopped.
+    """
+
+    ACTIONS = ("grant", "revoke")
+
+    def __init__(
+        self,
+        store: DataStore,
+        registration: RegistrationService,
+        guild: discord.Guild,
+        *,
+        action: str,
+        checkpoint: pathlib.Path,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate: float = DEFAULT_RATE,
+        members: Optional[MemberCache] = None,
+    ):
+        if action not in self.ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        self._store = store
+        self._registration = registration
+        self._guild = guild
+        self._action = action
+        self._checkpoint = checkpoint
+        self._concurrency = concurrency
+        self._budget = TokenBucket(rate)
+        self._members = members or MemberCache()
+
+    def _load_done(self, role: discord.Role) -> Set[int]:
+        try:
+            data = json.loads(self._checkpoint.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return set()
+        if data.get("action") != self._action or data.get("role_id") != role.id:
+            return set()
+        return {int(uid) for uid in data.get("done", [])}
+
+    def _save_done(self, role: discord.Role, done: Set[int]) -> None:
+        tmp = self._checkpoint.with_suffix(self._checkpoint.suffix + ".tmp")
+        tmp.write_text(
+            json.dumps({"action": self._action, "role_id": role.id, "done": sorted(done)}),
+            encoding="utf-8",
+        )
+        tmp.replace(self._checkpoint)
+
+    def plan(self, role: discord.Role, done: Set[int]) -> List[discord.Member]:
+        registered = set(self._store.user_ids())
+        if self._action == "grant":
+            members = (self._guild.get_member(uid) for uid in registered)
+            targets = [m for m in members if m is not None and m.get_role(role.id) is None]
+        else:
+            targets = [m for m in role.members if m.id not in registered]
+        return [m for m in targets if m.id not in done]
+
+    async def run(self, progress: Optional[ProgressReporter] = None) -> RoleSyncResult:
+        role = await self._registration.ensure_student_role(self._guild)
+        done = self._load_done(role)
+        # plan() reads the member cache; with a lazy cache, load what it needs first.
+        if self._action == "grant":
+            await self._members.ensure(self._guild, self._store.user_ids())
+        else:
+            await self._members.chunk(self._guild)
+        try:
+            targets = self.plan(role, done)
+        finally:
+            self._members.trim(self._guild)
+        result = RoleSyncResult(self._action, total=len(targets))
+        reason = f"bulk role sync ({self._action})"
+
+        async def apply(member: discord.Member) -> None:
+            try:
+                if self._action == "grant":
+                    await call("members.roles", lambda: member.add_roles(role, reason=reason))
+                else:
+                    await call("members.roles", lambda: member.remove_roles(role, reason=reason))
+            except (discord.Forbidden, discord.HTTPException, CircuitOpenError):
+                result.failed.append(member.id)
+            else:
+                result.changed += 1
+                done.add(member.id)
+                if result.changed % 50 == 0:
+                    self._save_done(role, done)
+            handled = result.changed + len(result.failed)
+            if progress is not None:
+                verb = "Granting" if self._action == "grant" else "Revoking"
+                await progress.update(f"⏳ {verb} role: {handled}/{result.total}")
+
+        await run_bounded(targets, apply, concurrency=self._concurrency, budget=self._budget)
+        if result.failed:
+            self._save_done(role, done)
+        else:
+            self._checkpoint.unlink(missing_ok=True)
+        return result
+
+
+# -------------------- Enrollment import --------------------
+
+IMPORT_USER_COLUMNS = {"user", "user_id", "discord_id", "discord id", "email"}
+IMPORT_FIELDS = ["line", "user", "dept", "number", "term", "status", "detail"]
+DEFAULT_BATCH_SIZE = 200
+
+
+@dataclass
+class ImportRow:
+    line: int
+    user: str
+    dept: str
+    number: str
+    term: str = ""
+    status: str = ""
+    detail: str = ""
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in IMPORT_FIELDS}
+
+
+def parse_enrollment_csv(text: str) -> List[ImportRow]:
+    """Rows of ``user, dept, number[, term]``; ``user`` is a Discord id or email.
+
+    A header row naming a user/email column is recognised and skipped.
+    """
+    reader = csv.reader(io.StringIO(text))
+    rows: List[ImportRow] = []
+    for line, cells in enumerate(reader, start=1):
+        cells = [cell.strip() for cell in cells]
+        if not any(cells):
+            continue
+        if line == 1 and cells[0].lower() in IMPORT_USER_COLUMNS:
+            continue
+        cells += [""] * (4 - len(cells))
+        rows.append(ImportRow(line, cells[0], cells[1].upper(), cells[2], cells[3].lower()))
+    return rows
+
+
+class EnrollmentImportJob:
+    """Pre-enroll many students from a CSV.
+
+    Rows are grouped by course so each thread is provisioned once, members are
+    added through the bounded pool, and enrollments are written to storage in
+    batches rather than one transaction per row. Each student's enroll/drop
+    lock is held from their first add until the batch holding their
+    enrollments is saved, so their own requests can't interleave.
+    """
+
+    def __init__(
+        self,
+        store: DataStore,
+        enrollment: EnrollmentService,
+        guild: discord.Guild,
+        rows: List[ImportRow],
+        *,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate: float = DEFAULT_RATE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        members: Optional[MemberCache] = None,
+    ):
+        self._store = store
+        self._enrollment = enrollment
+        self._guild = guild
+        self._rows = rows
+        self._concurrency = concurrency
+        self._budget = TokenBucket(rate)
+        self._batch_size = batch_size
+        self._members = members or MemberCache()
+        self._found: Dict[int, discord.Member] = {}
+        self._pending: List[Tuple[int, CourseKey]] = []
+        # Per-user locks of students whose enrollments are in ``_pending``.
+        self._held = contextlib.AsyncExitStack()
+
+    def _resolve_uid(self, row: ImportRow) -> Optional[int]:
+        if "@" in row.user:
+            return self._store.user_by_email(row.user)
+        if row.user.isdigit():
+            return int(row.user)
+        return None
+
+    def _resolve_member(self, row: ImportRow) -> Optional[discord.Member]:
+        uid = self._resolve_uid(row)
+        return self._found.get(uid) if uid is not None else None
+
+    def _validate(self, row: ImportRow) -> Optional[Tuple[discord.Member, CourseKey]]:
+        member = self._resolve_member(row)
+        if member is None:
+            row.status, row.detail = "error", "user not found in server"
+            return None
+        if row.dept not in courses.VALID_DEPTS:
+            row.status, row.detail = "error", f"unknown department {row.dept}"
+            return None
+        if not row.number:
+            row.status, row.detail = "error", "missing course number"
+            return None
+        try:
+            term = state.validate_term(row.term) if row.term else self._enrollment.current_term()
+        except ValueError as exc:
+            row.status, row.detail = "error", str(exc)
+            return None
+        if self._store.is_archived(term):
+            row.status, row.detail = "error", f"term {term} is archived"
+            return None
+        return member, CourseKey.of(row.dept, row.number, term=term)
+
+    async def _flush(self, *, force: bool = False) -> None:
+        if force or len(self._pending) >= self._batch_size:
+            batch, self._pending = self._pending, []
+            held, self._held = self._held, contextlib.AsyncExitStack()
+            try:
+                if batch:
+                    self._enrollment.record_enrollments(batch)
+            finally:
+                await held.aclose()
+
+    async def run(self, progress: Optional[ProgressReporter] = None) -> Dict[str, int]:
+        by_course: Dict[CourseKey, List[Tuple[ImportRow, discord.Member]]] = defaultdict(list)
+        uids = (self._resolve_uid(row) for row in self._rows)
+        self._found = await self._members.ensure(self._guild, [uid for uid in uids if uid is not None])
+        for row in self._rows:
+            parsed = self._validate(row)
+            if parsed is not None:
+                member, key = parsed
+                by_course[key].append((row, member))
+
+        work: List[Tuple[ImportRow, discord.Member, CourseKey, discord.TextChannel, discord.Thread]] = []
+        for key, members in by_course.items():
+            await self._budget.take()
+            try:
+                container, thread = await self._enrollment.provision(self._guild, key)
+            except (discord.HTTPException, CircuitOpenError) as exc:
+                for row, _ in members:
+                    row.status, row.detail = "error", f"could not create thread: {exc}"
+                continue
+            self._store.index_upsert(key, container.id, thread.id)
+            work.extend((row, member, key, container, thread) for row, member in members)
+
+        # Grouped per student, so each one's lock is taken once.
+        by_user: Dict[int, list] = defaultdict(list)
+        for item in work:
+            by_user[item[1].id].append(item)
+        handled = 0
+
+        async def add(uid: int) -> None:
+            nonlocal handled
+            lock = contextlib.AsyncExitStack()
+            await lock.enter_async_context(self._enrollment.user_lock(uid))
+            added_any = False
+            try:
+                for row, member, key, container, thread in by_user[uid]:
+                    await self._budget.take()
+                    ok, msg, added = await self._enrollment.add_member(container, thread, member, key)
+                    row.status, row.detail = ("ok" if ok else "error"), msg.replace("**", "")
+                    if added:
+                        self._pending.append((member.id, key))
+                        added_any = True
+                    handled += 1
+                    if progress is not None:
+                        await progress.update(f"⏳ Importing enrollments: {handled}/{len(work)}")
+            finally:
+                if added_any:
+                    # Released once the batch holding this user's enrollments is saved.
+                    self._held.push_async_callback(lock.aclose)
+                else:
+                    await lock.aclose()
+            await self._flush()
+
+        try:
+            await run_bounded(list(by_user), add, concurrency=self._concurrency)
+        finally:
+            await self._flush(force=True)
+        return dict(Counter(row.status for row in self._rows))
+
+    def results_csv(self) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=IMPORT_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(row.as_dict() for row in self._rows)
+        return buffer.getvalue().encode("utf-8")
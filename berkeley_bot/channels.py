@@ -2,17 +2,23 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import Callable, Optional
 
 import discord
 
+from .resilience import call
+from .tracing import traced
+
+
+@traced("channels.ensure_category")
 async def ensure_category(guild: discord.Guild, name: str) -> discord.CategoryChannel:
     category = discord.utils.get(guild.categories, name=name)
     if category:
         return category
-    return await guild.create_category(name)
+    return await call("channels.create", lambda: guild.create_category(name), idempotent=False)
 
 
+@traced("channels.ensure_container_text_channel")
 async def ensure_container_text_channel(
     guild: discord.Guild,
     parent: discord.CategoryChannel,
@@ -21,14 +27,19 @@ async def ensure_container_text_channel(
     channel = discord.utils.get(guild.text_channels, name=name)
     if channel:
         if channel.category_id != parent.id:
-            await channel.edit(category=parent)
+            await call("channels.edit", lambda: channel.edit(category=parent))
         return channel
     overwrites = {
         guild.default_role: discord.PermissionOverwrite(view_channel=False),
     }
-    return await guild.create_text_channel(name, category=parent, overwrites=overwrites)
+    return await call(
+        "channels.create",
+        lambda: guild.create_text_channel(name, category=parent, overwrites=overwrites),
+        idempotent=False,
+    )
 
 
+@traced("channels.fetch_archived_thread_by_name")
 async def fetch_archived_thread_by_name(
     container: discord.TextChannel, name: str
 ) -> Optional[discord.Thread]:
@@ -42,21 +53,60 @@ async def fetch_archived_thread_by_name(
     return None
 
 
+@traced("channels.revive_thread")
+async def revive_thread(
+    guild: discord.Guild, thread_id: int, *, unlock: bool = True
+) -> Optional[discord.Thread]:
+    """Unarchive a thread by id in one request; None if it no longer exists.
+
+    Archived threads aren't in the gateway cache, and ``Thread.edit`` needs a
+    ``Thread`` object. Patching the channel directly saves the fetch and
+    returns the updated thread payload. With ``unlock=False`` a thread an
+    admin locked stays locked.
+    """
+    fields = {"archived": False, "locked": False} if unlock else {"archived": False}
+    try:
+        data = await call("threads.edit", lambda: guild._state.http.edit_channel(thread_id, **fields))
+    except discord.NotFound:
+        return None
+    return discord.Thread(guild=guild, state=guild._state, data=data)
+
+
+@traced("channels.ensure_private_course_thread")
 async def ensure_private_course_thread(
     container: discord.TextChannel,
     slug: str,
+    *,
+    thread_id: Optional[int] = None,
+    on_create: Optional[Callable[[discord.Thread], None]] = None,
 ) -> discord.Thread:
+    """Find, revive or create the course thread; ``on_create`` runs only if a new one was made."""
+    if thread_id is not None:
+        active = container.guild.get_thread(thread_id)
+        if active is not None:
+            return active
+        revived = await revive_thread(container.guild, thread_id)
+        if revived is not None and revived.parent_id == container.id:
+            return revived
+
     existing = discord.utils.get(container.threads, name=slug)
     if existing:
         return existing
 
     archived = await fetch_archived_thread_by_name(container, slug)
     if archived:
-        await archived.edit(archived=False, locked=False)
+        await call("threads.edit", lambda: archived.edit(archived=False, locked=False))
         return archived
 
-    return await container.create_thread(
-        name=slug,
-        type=discord.ChannelType.private_thread,
-        invitable=False,
+    thread = await call(
+        "threads.create",
+        lambda: container.create_thread(
+            name=slug,
+            type=discord.ChannelType.private_thread,
+            invitable=False,
+        ),
+        idempotent=False,
     )
+    if on_create is not None:
+        on_create(thread)
+    return thread
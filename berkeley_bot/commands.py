@@ -2,40 +2,150 @@
 
 from __future__ import annotations
 
+import asyncio
+import io
 import logging
-from typing import List
+from typing import List, Optional
 
 import discord
 from discord import Embed, TextChannel, app_commands
 from discord.ext import commands
 
-from . import courses, state
+from . import courses, resilience, state
+from .admission import AdmissionController, AdmissionDenied, queue_notice
+from .bulk import (
+    DEFAULT_CONCURRENCY,
+    EnrollmentImportJob,
+    ProgressReporter,
+    RoleSyncJob,
+    parse_enrollment_csv,
+)
 from .config import BotConfig
-from .enrollment import EnrollmentService
+from .diagnostics import LoopWatchdog, memory_snapshot_for, profile_for, rss_bytes
+from .events import EventPusher
+from .export import export_parts, part_filenames
+from .leader import LeaderElection
+from .members import MemberCache
 from .permissions import require_student
-from .registration import RegistrationService
-from .storage import DataStore
-from .views import EnrollPanelView, DropMultiSelectView, VerifyPanelView
+from .tenancy import TenantRegistry
+from .timeline import TIMELINE
+from .tracing import TRACER
 
 
 def register_commands(
     bot: commands.Bot,
     config: BotConfig,
-    store: DataStore,
-    registration: RegistrationService,
-    enrollment: EnrollmentService,
+    tenants: TenantRegistry,
+    leader: LeaderElection,
+    members: MemberCache,
 ) -> None:
-    guild_object = discord.Object(id=config.guild_id)
+    guild_objects = tenants.guild_objects()
+    warm_up: Optional[asyncio.Task] = None
+    student_load: Optional[asyncio.Task] = None
+    # One controller for all guilds: they share this process's Discord API budget.
+    admission = AdmissionController(
+        user_rate=config.admission_user_rate,
+        user_burst=config.admission_user_burst,
+        max_active=config.admission_max_active,
+        max_queue=config.admission_max_queue,
+    )
+
+    def is_registered(member: discord.Member) -> bool:
+        ctx = tenants.get(member.guild.id)
+        return ctx is not None and ctx.store.user_get(member.id) is not None
+
+    members.keep = is_registered
+
+    async def load_students() -> None:
+        for ctx in tenants:
+            guild = bot.get_guild(ctx.guild_id)
+            if guild is None:
+                continue
+            found = await members.ensure(guild, ctx.store.user_ids())
+            logging.info("Cached %d registered members of %s", len(found), ctx.guild_id)
+
+    async def setup_hook() -> None:
+        nonlocal warm_up
+        TIMELINE.mark("login")
+        from .views import ComponentRouter
+
+        # One listener serves every panel, including ones posted before a restart.
+        ComponentRouter(bot, tenants, admission).install()
+        if config.loop_lag_warn_ms > 0:
+            LoopWatchdog(threshold=config.loop_lag_warn_ms / 1000).start()
+        # Every process runs a pusher; only the leader delivers, so events aren't sent twice.
+        EventPusher(
+            [ctx.events for ctx in tenants],
+            url=config.event_webhook_url,
+            socket_path=config.event_socket,
+            active=lambda: leader.is_leader,
+        ).start()
+
+        async def warm() -> None:
+            await tenants.warm_up()
+            TIMELINE.mark("cache warm-up")
+
+        # Parse the stores while the gateway handshake is still in flight.
+        warm_up = asyncio.create_task(warm())
+
+    bot.setup_hook = setup_hook
+
+    # Each slash command is one trace: the root opens here, in the task that
+    # runs the command, so spans inside it attach to the root automatically.
+    async def interaction_check(interaction: discord.Interaction) -> bool:
+        if interaction.type is discord.InteractionType.application_command and interaction.command:
+            TRACER.begin_interaction(
+                interaction.id,
+                f"/{interaction.command.qualified_name}",
+                guild=interaction.guild_id,
+                user=interaction.user.id,
+            )
+        return True
+
+    bot.tree.interaction_check = interaction_check
+    default_on_error = bot.tree.on_error
+
+    async def on_tree_error(interaction: discord.Interaction, error: app_commands.AppCommandError) -> None:
+        TRACER.end_interaction(interaction.id, error)
+        await default_on_error(interaction, error)
+
+    bot.tree.on_error = on_tree_error
+
+    @bot.event
+    async def on_app_command_completion(interaction: discord.Interaction, command) -> None:
+        TRACER.end_interaction(interaction.id)
 
     @bot.event
     async def on_ready() -> None:
-        await bot.tree.sync(guild=guild_object)
-        logging.info(
-            "✅ Logged in as %s | Synced for %s | term=%s",
-            bot.user,
-            config.guild_id,
-            state.current_term(),
-        )
+        nonlocal student_load
+        TIMELINE.mark("ready")
+        leader.start()
+
+        async def sync_all() -> None:
+            for ctx in tenants:
+                await bot.tree.sync(guild=discord.Object(id=ctx.guild_id))
+
+        synced = await leader.run_singleton("command sync", sync_all)
+        TIMELINE.mark("command sync")
+        if warm_up is not None:
+            await warm_up
+        TIMELINE.log_once()
+        for ctx in tenants:
+            logging.info(
+                "✅ Logged in as %s | %s for %s | term=%s | shards=%s",
+                bot.user,
+                "Synced" if synced else "Ready",
+                ctx.guild_id,
+                ctx.current_term(),
+                getattr(bot, "shard_ids", None) or "all",
+            )
+        if members.lazy and student_load is None:
+            # Startup chunking is off; pull in just the students, in the background.
+            student_load = asyncio.create_task(load_students())
+
+    @bot.listen("on_interaction")
+    async def remember_member(interaction: discord.Interaction) -> None:
+        members.touch(interaction.user)
 
     @bot.event
     async def on_member_join(member: discord.Member) -> None:
@@ -49,21 +159,31 @@ def register_commands(
         except discord.Forbidden:
             pass
 
-    @bot.tree.command(name="ping", description="Health check", guild=guild_object)
+    @bot.listen("on_message")
+    async def track_thread_activity(message: discord.Message) -> None:
+        # Recent messages keep a course thread off the auto-archive list.
+        if isinstance(message.channel, discord.Thread):
+            ctx = tenants.get(message.guild.id if message.guild else None)
+            if ctx is not None:
+                ctx.enrollment.threads.touch(message.channel.id)
+
+    @bot.tree.command(name="ping", description="Health check", guilds=guild_objects)
     async def ping(interaction: discord.Interaction) -> None:
         await interaction.response.send_message("Pong!", ephemeral=True)
 
     @bot.tree.command(
         name="panel",
         description="Post the enroll/drop panel in this channel",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.checks.has_permissions(manage_guild=True)
     async def panel(interaction: discord.Interaction) -> None:
         if interaction.channel is None or getattr(interaction.channel, "name", None) != "enroll":
             await interaction.response.send_message("Please run this in #enroll.", ephemeral=True)
             return
-        view = EnrollPanelView(bot, registration, enrollment, store)
+        from .views import enroll_panel_view
+
+        view = enroll_panel_view()
         await interaction.response.send_message(view=view)
         try:
             message = await interaction.original_response()
@@ -74,12 +194,14 @@ def register_commands(
     @bot.tree.command(
         name="panel_to",
         description="Post the enroll/drop panel to a target channel",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.describe(target="Channel to post the panel (e.g., #enroll)")
     @app_commands.checks.has_permissions(manage_guild=True)
     async def panel_to(interaction: discord.Interaction, target: TextChannel) -> None:
-        view = EnrollPanelView(bot, registration, enrollment, store)
+        from .views import enroll_panel_view
+
+        view = enroll_panel_view()
         embed = Embed(
             title="Course Enrollment Panel",
             description=(
@@ -100,14 +222,16 @@ def register_commands(
     @bot.tree.command(
         name="verify_panel",
         description="Post the registration panel in this channel (#verify)",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.checks.has_permissions(manage_guild=True)
     async def verify_panel(interaction: discord.Interaction) -> None:
         if interaction.channel is None or getattr(interaction.channel, "name", None) != "verify":
             await interaction.response.send_message("Please run this in #verify.", ephemeral=True)
             return
-        view = VerifyPanelView(bot, registration)
+        from .views import verify_panel_view
+
+        view = verify_panel_view()
         await interaction.response.send_message("Click the button below to start registration:", view=view)
         try:
             message = await interaction.original_response()
@@ -118,12 +242,14 @@ def register_commands(
     @bot.tree.command(
         name="verify_panel_to",
         description="Post the registration panel to a target channel",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.describe(target="Channel to post the verify panel (e.g., #verify)")
     @app_commands.checks.has_permissions(manage_guild=True)
     async def verify_panel_to(interaction: discord.Interaction, target: TextChannel) -> None:
-        view = VerifyPanelView(bot, registration)
+        from .views import verify_panel_view
+
+        view = verify_panel_view()
         embed = Embed(
             title="Berkeley Student Registration",
             description=(
@@ -151,12 +277,22 @@ def register_commands(
         name="Your full name (1-50 chars)",
     )
     async def register_cmd(interaction: discord.Interaction, student_id: str, email: str, name: str) -> None:
-        ok, message = await registration.register_user(bot, interaction, student_id, email, name)
-        prefix = "✅ " if ok else "❌ "
-        await interaction.response.send_message(prefix + message, ephemeral=True)
+        registration = tenants.resolve(interaction).registration
+        try:
+            async with admission.admit(interaction.user.id, on_queued=queue_notice(interaction)):
+                ok, message = await registration.register_user(bot, interaction, student_id, email, name)
+            text = ("✅ " if ok else "❌ ") + message
+        except AdmissionDenied as exc:
+            text = str(exc)
+        if interaction.response.is_done():
+            await interaction.edit_original_response(content=text)
+        else:
+            await interaction.response.send_message(text, ephemeral=True)
 
     @bot.tree.command(name="whoami", description="Show my registration")
     async def whoami(interaction: discord.Interaction) -> None:
+        ctx = tenants.resolve(interaction)
+        registration = ctx.registration
         record = registration.user_get(interaction.user.id)
         if not record:
             await interaction.response.send_message("You are not registered. Use `/register`.", ephemeral=True)
@@ -166,11 +302,7 @@ def register_commands(
         name = record["name"]
         masked_sid = f"{sid[:2]}******{sid[-2:]}"
         role_line = ""
-        target_guild = None
-        if interaction.guild and interaction.guild.id == config.guild_id:
-            target_guild = interaction.guild
-        else:
-            target_guild = bot.get_guild(config.guild_id)
+        target_guild = ctx.resolve_guild(bot, interaction)
         if target_guild:
             try:
                 member = target_guild.get_member(interaction.user.id) or await target_guild.fetch_member(
@@ -188,24 +320,21 @@ def register_commands(
 
     @bot.tree.command(name="unregister", description="Remove my registration")
     async def unregister_cmd(interaction: discord.Interaction) -> None:
-        registration.user_delete(interaction.user.id)
-        target_guild = None
-        if interaction.guild and interaction.guild.id == config.guild_id:
-            target_guild = interaction.guild
-        else:
-            target_guild = bot.get_guild(config.guild_id)
+        ctx = tenants.resolve(interaction)
+        ctx.registration.user_delete(interaction.user.id)
+        target_guild = ctx.resolve_guild(bot, interaction)
         if target_guild:
-            await registration.remove_student_role(target_guild, interaction.user.id)
+            await ctx.registration.remove_student_role(target_guild, interaction.user.id)
         await interaction.response.send_message("✅ Registration removed.", ephemeral=True)
 
     @bot.tree.command(
         name="enroll",
         description="Join or create a private course thread",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.describe(dept="Department (e.g. PHYSICS, CS)", number="Course number (e.g. 105)")
     @app_commands.autocomplete(dept=courses.dept_autocomplete)
-    @require_student(registration)
+    @require_student(tenants)
     async def enroll_cmd(interaction: discord.Interaction, dept: str, number: str) -> None:
         if interaction.channel and getattr(interaction.channel, "name", None) != "enroll":
             await interaction.response.send_message("⚠️ Please use this command in the #enroll channel.", ephemeral=True)
@@ -219,67 +348,85 @@ def register_commands(
                 ephemeral=True,
             )
             return
-        ok, msg = await enrollment.enroll_one(interaction.guild, interaction.user, dept_up, number)
+        enrollment = tenants.resolve(interaction).enrollment
+        key = enrollment.course_key(dept_up, number)
+        try:
+            async with admission.admit(interaction.user.id, on_queued=queue_notice(interaction)):
+                [(_, ok, msg)] = await enrollment.enroll_many(interaction.guild, interaction.user, [key])
+        except AdmissionDenied as exc:
+            await interaction.followup.send(str(exc), ephemeral=True)
+            return
         prefix = "✅ " if ok else "❌ "
         await interaction.followup.send(prefix + msg, ephemeral=True)
 
     @bot.tree.command(
         name="drop",
         description="Leave a course (select from your current enrollments)",
-        guild=guild_object,
+        guilds=guild_objects,
     )
-    @require_student(registration)
+    @require_student(tenants)
     async def drop_cmd(interaction: discord.Interaction) -> None:
+        from .views import drop_select_view
+
         await interaction.response.defer(ephemeral=True)
-        slugs = store.list_enrollments_for_term(interaction.user.id, state.current_term())
-        if not slugs:
+        ctx = tenants.resolve(interaction)
+        keys = ctx.store.list_enrollments_for_term(interaction.user.id, ctx.current_term())
+        if not keys:
             await interaction.followup.send("You haven’t joined any courses this term.", ephemeral=True)
             return
         await interaction.followup.send(
             "Select a course to leave (single-select). For multi-drop, use the Drop courses button on the panel.",
-            view=DropMultiSelectView(interaction.user, registration, enrollment, slugs[:25]),
+            view=drop_select_view(interaction.user.id, keys),
             ephemeral=True,
         )
 
     @bot.tree.command(
         name="drop_exact",
         description="Leave a specific course by dept & number",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.describe(dept="e.g. PHYSICS", number="e.g. 105")
     @app_commands.autocomplete(dept=courses.dept_autocomplete)
-    @require_student(registration)
+    @require_student(tenants)
     async def drop_exact(interaction: discord.Interaction, dept: str, number: str) -> None:
         await interaction.response.defer(ephemeral=True)
-        slug = courses.course_slug_for(dept.upper(), number)
-        ok, fail = await enrollment.drop_many(interaction.guild, interaction.user, [slug])
+        ctx = tenants.resolve(interaction)
+        key = ctx.enrollment.course_key(dept, number)
+        try:
+            async with admission.admit(interaction.user.id, on_queued=queue_notice(interaction)):
+                ok, fail = await ctx.enrollment.drop_many(interaction.guild, interaction.user, [key])
+        except AdmissionDenied as exc:
+            await interaction.followup.send(str(exc), ephemeral=True)
+            return
         if ok:
-            await interaction.followup.send(f"✅ You’ve left **{ok[0]}**.", ephemeral=True)
+            await interaction.followup.send(f"✅ You’ve left **{ok[0].slug}**.", ephemeral=True)
         else:
             await interaction.followup.send(f"❌ {fail[0]}", ephemeral=True)
 
     @bot.tree.command(
         name="mycourses",
         description="List your enrolled courses",
-        guild=guild_object,
+        guilds=guild_objects,
     )
-    @require_student(registration)
+    @require_student(tenants)
     async def mycourses(interaction: discord.Interaction) -> None:
         await interaction.response.defer(ephemeral=True)
-        slugs = store.list_enrollments_for_term(interaction.user.id, state.current_term())
-        if not slugs:
+        ctx = tenants.resolve(interaction)
+        term = ctx.current_term()
+        keys = ctx.store.list_enrollments_for_term(interaction.user.id, term)
+        if not keys:
             await interaction.followup.send(
-                f"You haven’t joined any courses this term ({state.current_term().upper()}).",
+                f"You haven’t joined any courses this term ({term.upper()}).",
                 ephemeral=True,
             )
             return
         lines: List[str] = []
-        for slug in slugs:
-            meta = store.index_get(slug)
+        for key in keys:
+            meta = ctx.store.index_get(key)
             if meta:
-                lines.append(f"- <#{meta['thread_id']}> (`#{slug}`)")
+                lines.append(f"- <#{meta['thread_id']}> (`#{key.slug}`)")
             else:
-                lines.append(f"- `#{slug}` (not indexed)")
+                lines.append(f"- `#{key.slug}` (not indexed)")
         await interaction.followup.send(
             "Here are your current courses:\n" + "\n".join(lines),
             ephemeral=True,
@@ -288,7 +435,7 @@ def register_commands(
     @bot.tree.command(
         name="archive",
         description="Archive and lock all current-term course threads",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.checks.has_permissions(manage_threads=True)
     async def archive(interaction: discord.Interaction) -> None:
@@ -297,13 +444,14 @@ def register_commands(
         if not guild:
             await interaction.followup.send("This command must be used in the server.", ephemeral=True)
             return
-        category = discord.utils.get(guild.categories, name=courses.course_category_name())
+        ctx = tenants.resolve(interaction)
+        current_term = ctx.current_term()
+        category = discord.utils.get(guild.categories, name=courses.course_category_name(current_term))
         if not category:
             await interaction.followup.send("No course category found.", ephemeral=True)
             return
 
         count = 0
-        current_term = state.current_term()
         for channel in category.channels:
             if not isinstance(channel, discord.TextChannel):
                 continue
@@ -312,6 +460,7 @@ def register_commands(
                     try:
                         await thread.edit(locked=True, archived=True)
                         count += 1
+                        ctx.enrollment.thread_archived(thread, reason="admin")
                     except discord.HTTPException:
                         pass
             for private in (False, True):
@@ -321,6 +470,7 @@ def register_commands(
                             try:
                                 await thread.edit(locked=True, archived=True)
                                 count += 1
+                                ctx.enrollment.thread_archived(thread, reason="admin")
                             except discord.HTTPException:
                                 pass
                 except discord.HTTPException:
@@ -331,29 +481,343 @@ def register_commands(
     @bot.tree.command(
         name="set_term",
         description="Set the current academic term",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.describe(term="e.g. fa25 or sp26")
     @app_commands.checks.has_permissions(manage_guild=True)
     async def set_term(interaction: discord.Interaction, term: str) -> None:
+        ctx = tenants.resolve(interaction)
+        previous = ctx.current_term()
         try:
-            state.set_current_term(term)
+            state.set_current_term(term, guild_id=interaction.guild_id)
         except ValueError:
             await interaction.response.send_message("Format error: must be faYY or spYY (e.g., fa25).", ephemeral=True)
             return
-        await interaction.response.send_message(
-            f"✅ Term set to **{state.current_term().upper()}**.",
-            ephemeral=True,
-        )
+        await interaction.response.defer(ephemeral=True)
+        current = ctx.current_term()
+        # Roll storage over so only the new term stays hot. This runs on the loop:
+        # the store and event log are only safe to mutate from one thread.
+        try:
+            archived = ctx.enrollment.rollover(current)
+            ctx.store.save_term(current)
+        except Exception:
+            # Put the old term back, and its data too in case it was archived before the failure.
+            state.set_current_term(previous, guild_id=interaction.guild_id)
+            try:
+                ctx.store.rollover(previous)
+            except Exception:
+                logging.exception("Could not restore term %s after a failed rollover", previous)
+            raise
+        note = f" Archived {', '.join(t.upper() for t in archived)}." if archived else ""
+        await interaction.followup.send(f"✅ Term set to **{current.upper()}**.{note}", ephemeral=True)
 
     @bot.tree.command(
         name="sync",
         description="Re-sync slash commands for this guild",
-        guild=guild_object,
+        guilds=guild_objects,
     )
     @app_commands.checks.has_permissions(administrator=True)
     async def sync_cmd(interaction: discord.Interaction) -> None:
         await interaction.response.defer(ephemeral=True)
-        await bot.tree.sync(guild=guild_object)
+        await bot.tree.sync(guild=discord.Object(id=interaction.guild_id))
         await interaction.followup.send("✅ Commands re-synced.", ephemeral=True)
 
+    @bot.tree.command(
+        name="export",
+        description="Export enrollments with student names as CSV or NDJSON",
+        guilds=guild_objects,
+    )
+    @app_commands.describe(
+        fmt="File format",
+        term="Only this term (e.g. fa25)",
+        dept="Only this department (e.g. CS)",
+    )
+    @app_commands.rename(fmt="format")
+    @app_commands.choices(
+        fmt=[
+            app_commands.Choice(name="CSV", value="csv"),
+            app_commands.Choice(name="NDJSON", value="ndjson"),
+        ]
+    )
+    @app_commands.autocomplete(dept=courses.dept_autocomplete)
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def export_cmd(
+        interaction: discord.Interaction,
+        fmt: str = "csv",
+        term: Optional[str] = None,
+        dept: Optional[str] = None,
+    ) -> None:
+        await interaction.response.defer(ephemeral=True)
+        store = tenants.resolve(interaction).store
+        # Built on the loop, which owns the store, in batches that yield between
+        # them; parts spill to temp files so memory stays flat.
+        parts = await export_parts(store, fmt, term=term, dept=dept)
+        stem = "-".join(["enrollments", *(p.lower() for p in (term, dept) if p)])
+        files = [
+            discord.File(part, filename=name)
+            for part, name in zip(parts, part_filenames(stem, fmt, len(parts)))
+        ]
+        try:
+            # Each part is sized to fill one message's upload limit on its own.
+            for i, file in enumerate(files):
+                await interaction.followup.send(
+                    "📤 Export ready." if i == 0 else None,
+                    file=file,
+                    ephemeral=True,
+                )
+        finally:
+            for part in parts:
+                part.close()
+
+    @bot.tree.command(
+        name="roster_import",
+        description="Load the official roster CSV that registrations are checked against",
+        guilds=guild_objects,
+    )
+    @app_commands.describe(
+        file="CSV with SID and email columns",
+        replace="Replace the current roster (default) instead of adding to it",
+    )
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def roster_import(
+        interaction: discord.Interaction,
+        file: discord.Attachment,
+        replace: bool = True,
+    ) -> None:
+        await interaction.response.defer(ephemeral=True)
+        try:
+            text = (await file.read()).decode("utf-8-sig")
+        except (discord.HTTPException, UnicodeDecodeError) as exc:
+            await interaction.followup.send(f"❌ Couldn’t read the roster: {exc}", ephemeral=True)
+            return
+        registration = tenants.resolve(interaction).registration
+        total, skipped = await registration.import_roster(text, replace=replace)
+        note = f" Skipped {skipped} row(s) without a valid SID." if skipped else ""
+        await interaction.followup.send(f"📋 Roster now lists {total} student(s).{note}", ephemeral=True)
+
+    role_sync_running: set[int] = set()
+
+    @bot.tree.command(
+        name="role_sync",
+        description="Grant or revoke the student role in bulk to match registrations",
+        guilds=guild_objects,
+    )
+    @app_commands.describe(
+        action="grant: registered members missing the role; revoke: unregistered members holding it",
+        concurrency="Parallel role edits (1-10)",
+    )
+    @app_commands.choices(
+        action=[
+            app_commands.Choice(name="grant", value="grant"),
+            app_commands.Choice(name="revoke", value="revoke"),
+        ]
+    )
+    @app_commands.checks.has_permissions(manage_roles=True)
+    async def role_sync(
+        interaction: discord.Interaction,
+        action: str = "grant",
+        concurrency: app_commands.Range[int, 1, 10] = DEFAULT_CONCURRENCY,
+    ) -> None:
+        if not interaction.guild:
+            await interaction.response.send_message("Use this command inside the server.", ephemeral=True)
+            return
+        if interaction.guild.id in role_sync_running:
+            await interaction.response.send_message("A role sync is already running here.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        ctx = tenants.resolve(interaction)
+        job = RoleSyncJob(
+            ctx.store,
+            ctx.registration,
+            interaction.guild,
+            action=action,
+            checkpoint=ctx.config.paths.role_sync,
+            concurrency=concurrency,
+            members=members,
+        )
+        message = await interaction.followup.send("⏳ Computing role changes…", ephemeral=True, wait=True)
+        progress = ProgressReporter(lambda text: message.edit(content=text))
+        role_sync_running.add(interaction.guild.id)
+        try:
+            result = await job.run(progress)
+        finally:
+            role_sync_running.discard(interaction.guild.id)
+        await progress.update(f"✅ {result.summary()}", final=True)
+
+    enroll_import_running: set[int] = set()
+
+    @bot.tree.command(
+        name="enroll_import",
+        description="Pre-enroll students from a CSV of user, dept, number[, term]",
+        guilds=guild_objects,
+    )
+    @app_commands.describe(
+        file="CSV rows: Discord user id or registered email, dept, number, optional term",
+        concurrency="Parallel thread additions (1-10)",
+    )
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def enroll_import(
+        interaction: discord.Interaction,
+        file: discord.Attachment,
+        concurrency: app_commands.Range[int, 1, 10] = DEFAULT_CONCURRENCY,
+    ) -> None:
+        if not interaction.guild:
+            await interaction.response.send_message("Use this command inside the server.", ephemeral=True)
+            return
+        if interaction.guild.id in enroll_import_running:
+            await interaction.response.send_message("An enrollment import is already running here.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        try:
+            rows = parse_enrollment_csv((await file.read()).decode("utf-8-sig"))
+        except (discord.HTTPException, UnicodeDecodeError) as exc:
+            await interaction.followup.send(f"❌ Couldn’t read the CSV: {exc}", ephemeral=True)
+            return
+        ctx = tenants.resolve(interaction)
+        job = EnrollmentImportJob(
+            ctx.store, ctx.enrollment, interaction.guild, rows, concurrency=concurrency, members=members
+        )
+        message = await interaction.followup.send(f"⏳ Importing {len(rows)} row(s)…", ephemeral=True, wait=True)
+        progress = ProgressReporter(lambda text: message.edit(content=text))
+        enroll_import_running.add(interaction.guild.id)
+        try:
+            counts = await job.run(progress)
+        finally:
+            enroll_import_running.discard(interaction.guild.id)
+        summary = f"✅ Import finished: {counts.get('ok', 0)} ok, {counts.get('error', 0)} failed."
+        await progress.update(summary, final=True)
+        results = job.results_csv()
+
+        def report() -> discord.File:
+            return discord.File(io.BytesIO(results), filename="enroll_import_results.csv")
+
+        try:
+            await interaction.followup.send(summary, file=report(), ephemeral=True)
+        except discord.HTTPException:
+            # The interaction token is gone after 15 minutes. The report lists student
+            # emails and ids, so send it privately to the admin who ran the import.
+            try:
+                await interaction.user.send(summary, file=report())
+            except discord.HTTPException:
+                if isinstance(interaction.channel, discord.abc.Messageable):
+                    await interaction.channel.send(
+                        f"{interaction.user.mention} {summary} The results file couldn’t be delivered privately; "
+                        "allow DMs from this server and re-run the import to get it.",
+                        allowed_mentions=discord.AllowedMentions(users=[interaction.user]),
+                    )
+
+    @bot.tree.command(
+        name="breakers",
+        description="Show admission control and circuit breaker state of Discord API routes",
+        guilds=guild_objects,
+    )
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def breakers(interaction: discord.Interaction) -> None:
+        statuses = resilience.breaker_statuses()
+        gate = admission.report()
+        lines = [
+            f"🚦 Admission: {gate['active']}/{gate['max_active']} active · "
+            f"{gate['waiting']}/{gate['max_queue']} waiting · {gate['admitted']} admitted · "
+            f"{gate['queued']} queued · {gate['rejected']} rejected"
+        ]
+        if not statuses:
+            lines.append("No Discord calls recorded yet.")
+            await interaction.response.send_message("\n".join(lines), ephemeral=True)
+            return
+        icons = {"closed": "🟢", "half-open": "🟡", "open": "🔴"}
+        for status in statuses:
+            line = (
+                f"{icons[status.state]} `{status.route}` {status.state} · "
+                f"{status.calls} calls · {status.failures} recent failures · {status.trips} trips"
+            )
+            if status.state == "open":
+                line += f" · retry in {status.retry_after:.0f}s"
+            lines.append(line)
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    @bot.tree.command(
+        name="stats_courses",
+        description="Show the most popular courses and department totals",
+        guilds=guild_objects,
+    )
+    @app_commands.describe(top="How many courses to list (1-25)", term="Term (defaults to the current term)")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def stats_courses(
+        interaction: discord.Interaction,
+        top: app_commands.Range[int, 1, 25] = 10,
+        term: Optional[str] = None,
+    ) -> None:
+        ctx = tenants.resolve(interaction)
+        term = (term or ctx.current_term()).lower()
+        ranked = ctx.store.top_courses(term, top)
+        depts = sorted(ctx.store.dept_counts(term).items(), key=lambda item: (-item[1], item[0]))
+        if not ranked:
+            await interaction.response.send_message(f"No enrollments for **{term.upper()}** yet.", ephemeral=True)
+            return
+        course_lines = [f"{i}. `{key.slug}` — {count}" for i, (key, count) in enumerate(ranked, start=1)]
+        dept_lines = [f"- {dept.upper()}: {count}" for dept, count in depts]
+        await interaction.response.send_message(
+            f"📊 **Enrollments for {term.upper()}** ({sum(c for _, c in depts)} total)\n"
+            "**Top courses**\n" + "\n".join(course_lines) + "\n"
+            "**Departments**\n" + "\n".join(dept_lines),
+            ephemeral=True,
+        )
+
+    @bot.tree.command(
+        name="profile",
+        description="Profile the running bot with cProfile for a few seconds",
+        guilds=guild_objects,
+    )
+    @app_commands.describe(seconds="How long to profile (1-60)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def profile_cmd(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 60] = 10) -> None:
+        await interaction.response.defer(ephemeral=True)
+        report, raw = await profile_for(seconds)
+        await interaction.followup.send(
+            f"🔬 Profiled {seconds}s of the event loop.",
+            files=[
+                discord.File(io.BytesIO(report.encode("utf-8")), filename="profile.txt"),
+                discord.File(io.BytesIO(raw), filename="profile.prof"),
+            ],
+            ephemeral=True,
+        )
+
+    @bot.tree.command(
+        name="memsnapshot",
+        description="Trace memory allocations for a few seconds",
+        guilds=guild_objects,
+    )
+    @app_commands.describe(seconds="How long to trace allocations (1-60)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def memsnapshot(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 60] = 10) -> None:
+        await interaction.response.defer(ephemeral=True)
+        report = await memory_snapshot_for(seconds)
+        await interaction.followup.send(
+            f"🧠 Traced allocations for {seconds}s.",
+            file=discord.File(io.BytesIO(report.encode("utf-8")), filename="memsnapshot.txt"),
+            ephemeral=True,
+        )
+
+    @bot.tree.command(
+        name="memory_report",
+        description="Show in-memory storage footprint for this server",
+        guilds=guild_objects,
+    )
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def memory_report(interaction: discord.Interaction) -> None:
+        report = tenants.resolve(interaction).store.memory_report()
+        compact, as_json = report["compact_bytes"], report["json_bytes"]
+        saved = 100 * (1 - compact / as_json) if as_json else 0.0
+        cache = members.report(list(bot.guilds))
+        rss = rss_bytes()
+        await interaction.response.send_message(
+            "🧮 **Storage memory**\n"
+            f"- Users: {report['users']} registered, {report['enrolled_users']} enrolled\n"
+            f"- Enrollments: {report['enrollments']} across {report['slugs']} interned slugs\n"
+            f"- Compact tables: {compact / 1024:.1f} KiB\n"
+            f"- Plain JSON dicts: {as_json / 1024:.1f} KiB ({saved:.0f}% saved)\n"
+            f"👥 **Member cache** ({cache['mode']})\n"
+            f"- Cached: {cache['cached']} of {cache['total']} members ({cache['recent']} recently active)\n"
+            f"- Process RSS: {f'{rss / 2**20:.1f} MiB' if rss is not None else 'unavailable'}",
+            ephemeral=True,
+        )
@@ -0,0 +1,375 @@
+"""Compact in-memory forms of the JSON documents kept by :class:`DataStore`.
+
+The JSON files stay the source of truth on disk. In memory, users are keyed by
+integer snowflakes, every :class:`~.courses.CourseKey` is interned once in a
+:class:`SlugTable`, and each user's courses are ``array``s of small slug ids
+grouped by term and department rather than a list of full strings.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .courses import CourseKey
+
+log = logging.getLogger(__name__)
+
+SLUG_ID_TYPECODE = "I"
+
+
+class SlugTable:
+    """Bidirectional CourseKey <-> small int intern table."""
+
+    __slots__ = ("_ids", "_keys")
+
+    def __init__(self) -> None:
+        self._ids: Dict[CourseKey, int] = {}
+        self._keys: List[CourseKey] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def intern(self, key: CourseKey) -> int:
+        sid = self._ids.get(key)
+        if sid is None:
+            sid = len(self._keys)
+            self._ids[key] = sid
+            self._keys.append(key)
+        return sid
+
+    def get(self, key: CourseKey) -> Optional[int]:
+        return self._ids.get(key)
+
+    def key(self, sid: int) -> CourseKey:
+        return self._keys[sid]
+
+
+class EnrollmentCounters:
+    """Enrollment totals per (term, slug) and (term, dept), kept in step with writes."""
+
+    __slots__ = ("slugs", "by_course", "by_dept")
+
+    def __init__(self, slugs: SlugTable):
+        self.slugs = slugs
+        self.by_course: Counter = Counter()
+        self.by_dept: Counter = Counter()
+
+    def adjust(self, sid: int, delta: int) -> None:
+        self.by_course[sid] += delta
+        if self.by_course[sid] <= 0:
+            del self.by_course[sid]
+        key = self.slugs.key(sid)
+        dept_key = (key.term, key.dept)
+        self.by_dept[dept_key] += delta
+        if self.by_dept[dept_key] <= 0:
+            del self.by_dept[dept_key]
+
+    def course_counts(self, term: str) -> Dict[CourseKey, int]:
+        term = term.lower()
+        key = self.slugs.key
+        return {key(sid): count for sid, count in self.by_course.items() if key(sid).term == term}
+
+    def top_courses(self, term: str, n: int) -> List[Tuple[CourseKey, int]]:
+        return heapq.nlargest(n, self.course_counts(term).items(), key=lambda item: item[1])
+
+    def dept_counts(self, term: str) -> Dict[str, int]:
+        term = term.lower()
+        return {dept: count for (t, dept), count in self.by_dept.items() if t == term}
+
+    def to_json(self) -> dict:
+        courses_out: Dict[str, Dict[str, int]] = {}
+        for sid, count in self.by_course.items():
+            key = self.slugs.key(sid)
+            courses_out.setdefault(key.term, {})[key.slug] = count
+        depts_out: Dict[str, Dict[str, int]] = {}
+        for (term, dept), count in self.by_dept.items():
+            depts_out.setdefault(term, {})[dept] = count
+        return {"courses": courses_out, "departments": depts_out}
+
+
+class UserRecord:
+    __slots__ = ("student_id", "email", "name")
+
+    def __init__(self, student_id: str, email: str, name: str):
+        self.student_id = student_id
+        self.email = email
+        self.name = name
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> "UserRecord":
+        return cls(str(raw["student_id"]), str(raw["email"]), str(raw["name"]))
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"student_id": self.student_id, "email": self.email, "name": self.name}
+
+
+class UserTable:
+    """User records plus student_id -> uid and email -> uid hash indexes."""
+
+    __slots__ = ("records", "by_sid", "by_email")
+
+    def __init__(self) -> None:
+        self.records: Dict[int, UserRecord] = {}
+        self.by_sid: Dict[str, int] = {}
+        self.by_email: Dict[str, int] = {}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "UserTable":
+        table = cls()
+        for uid, raw in data.items():
+            if raw:
+                table.put(int(uid), UserRecord.from_dict(raw))
+        return table
+
+    def to_json(self) -> dict:
+        return {str(uid): record.to_dict() for uid, record in self.records.items()}
+
+    def put(self, uid: int, record: UserRecord) -> None:
+        self.pop(uid)
+        self.records[uid] = record
+        self.by_sid[record.student_id] = uid
+        self.by_email[record.email.lower()] = uid
+
+    def pop(self, uid: int) -> Optional[UserRecord]:
+        record = self.records.pop(uid, None)
+        if record is not None:
+            if self.by_sid.get(record.student_id) == uid:
+                del self.by_sid[record.student_id]
+            if self.by_email.get(record.email.lower()) == uid:
+                del self.by_email[record.email.lower()]
+        return record
+
+    def conflict(self, uid: int, student_id: str, email: str) -> Optional[str]:
+        """Name of the field another uid already holds, if any."""
+        if self.by_sid.get(student_id, uid) != uid:
+            return "student_id"
+        if self.by_email.get(email.lower(), uid) != uid:
+            return "email"
+        return None
+
+
+class RosterTable:
+    """Official roster as student_id -> lowercased email ("" when not given)."""
+
+    __slots__ = ("students",)
+
+    def __init__(self, students: Optional[Dict[str, str]] = None):
+        self.students: Dict[str, str] = students or {}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "RosterTable":
+        return cls({str(sid): str(email).lower() for sid, email in data.get("students", {}).items()})
+
+    def to_json(self) -> dict:
+        return {"students": self.students}
+
+
+class EnrollmentTable:
+    """Per-user enrollments indexed as user id -> term -> dept -> slug ids.
+
+    Each innermost ``array`` acts as a small ordered set of the courses the
+    user holds in that department, so term and term+dept queries are direct
+    lookups instead of prefix scans over every slug.
+    """
+
+    __slots__ = ("slugs", "by_user", "counters", "unparsed")
+
+    def __init__(self, slugs: SlugTable):
+        self.slugs = slugs
+        self.by_user: Dict[int, Dict[str, Dict[str, array]]] = {}
+        self.counters = EnrollmentCounters(slugs)
+        # Slugs CourseKey can't parse, kept verbatim so saving never drops them.
+        self.unparsed: Dict[str, List[str]] = {}
+
+    @classmethod
+    def from_json(cls, data: dict, slugs: SlugTable) -> "EnrollmentTable":
+        table = cls(slugs)
+        for uid, entries in data.items():
+            for slug in entries or ():
+                key = CourseKey.parse(slug)
+                if key is not None:
+                    table.add(int(uid), key)
+                else:
+                    table.unparsed.setdefault(str(uid), []).append(slug)
+        if table.unparsed:
+            log.warning(
+                "Keeping %d unparseable enrollment slug(s) as-is",
+                sum(map(len, table.unparsed.values())),
+            )
+        return table
+
+    def to_json(self) -> dict:
+        out = {str(uid): [key.slug for key in self.list(uid)] for uid in self.by_user}
+        for uid, slugs in self.unparsed.items():
+            out.setdefault(uid, []).extend(slugs)
+        return out
+
+    def add(self, uid: int, key: CourseKey) -> bool:
+        sid = self.slugs.intern(key)
+        term, dept = key.term, key.dept
+        bucket = self.by_user.setdefault(uid, {}).setdefault(term, {}).get(dept)
+        if bucket is None:
+            self.by_user[uid][term][dept] = array(SLUG_ID_TYPECODE, (sid,))
+        elif sid in bucket:
+            return False
+        else:
+            bucket.append(sid)
+        self.counters.adjust(sid, 1)
+        return True
+
+    def remove(self, uid: int, key: CourseKey) -> bool:
+        sid = self.slugs.get(key)
+        if sid is None:
+            return False
+        term, dept = key.term, key.dept
+        terms = self.by_user.get(uid)
+        depts = terms.get(term) if terms else None
+        bucket = depts.get(dept) if depts else None
+        if bucket is None or sid not in bucket:
+            return False
+        bucket.remove(sid)
+        if not bucket:
+            del depts[dept]
+            if not depts:
+                del terms[term]
+                if not terms:
+                    del self.by_user[uid]
+        self.counters.adjust(sid, -1)
+        return True
+
+    def list(self, uid: int) -> List[CourseKey]:
+        key = self.slugs.key
+        return [
+            key(sid)
+            for depts in self.by_user.get(uid, {}).values()
+            for bucket in depts.values()
+            for sid in bucket
+        ]
+
+    def list_term(self, uid: int, term: str) -> List[CourseKey]:
+        key = self.slugs.key
+        depts = self.by_user.get(uid, {}).get(term.lower(), {})
+        return [key(sid) for bucket in depts.values() for sid in bucket]
+
+    def list_term_dept(self, uid: int, term: str, dept: str) -> List[CourseKey]:
+        key = self.slugs.key
+        bucket = self.by_user.get(uid, {}).get(term.lower(), {}).get(dept.lower(), ())
+        return [key(sid) for sid in bucket]
+
+    def dept_totals(self, uid: int, term: str) -> Dict[str, int]:
+        depts = self.by_user.get(uid, {}).get(term.lower(), {})
+        return {dept: len(bucket) for dept, bucket in depts.items()}
+
+    def total(self) -> int:
+        return sum(
+            len(bucket)
+            for terms in self.by_user.values()
+            for depts in terms.values()
+            for bucket in depts.values()
+        )
+
+    def items(self) -> Iterator[Tuple[int, List[CourseKey]]]:
+        for uid in self.by_user:
+            yield uid, self.list(uid)
+
+    def terms(self) -> Set[str]:
+        return {term for terms in self.by_user.values() for term in terms}
+
+    def extract_term(self, term: str) -> Dict[str, List[str]]:
+        """Remove every enrollment in ``term``; returns them in JSON form."""
+        out: Dict[str, List[str]] = {}
+        for uid in list(self.by_user):
+            keys = self.list_term(uid, term)
+            for key in keys:
+                self.remove(uid, key)
+            if keys:
+                out[str(uid)] = [key.slug for key in keys]
+        return out
+
+
+class CourseIndexTable:
+    """course id -> (container_id, thread_id)."""
+
+    __slots__ = ("slugs", "entries", "unparsed")
+
+    def __init__(self, slugs: SlugTable):
+        self.slugs = slugs
+        self.entries: Dict[int, Tuple[int, int]] = {}
+        # Entries whose slug CourseKey can't parse, kept verbatim so saving never drops them.
+        self.unparsed: Dict[str, dict] = {}
+
+    @classmethod
+    def from_json(cls, data: dict, slugs: SlugTable) -> "CourseIndexTable":
+        table = cls(slugs)
+        for slug, raw in data.items():
+            key = CourseKey.parse(slug)
+            if key is not None:
+                table.entries[slugs.intern(key)] = (int(raw["container_id"]), int(raw["thread_id"]))
+            else:
+                table.unparsed[slug] = raw
+        if table.unparsed:
+            log.warning("Keeping %d unparseable course index entries as-is", len(table.unparsed))
+        return table
+
+    def to_json(self) -> dict:
+        key = self.slugs.key
+        out = {
+            key(sid).slug: {"container_id": container_id, "thread_id": thread_id}
+            for sid, (container_id, thread_id) in self.entries.items()
+        }
+        out.update(self.unparsed)
+        return out
+
+    def get(self, key: CourseKey) -> Optional[Tuple[int, int]]:
+        sid = self.slugs.get(key)
+        return None if sid is None else self.entries.get(sid)
+
+    def put(self, key: CourseKey, container_id: int, thread_id: int) -> None:
+        self.entries[self.slugs.intern(key)] = (int(container_id), int(thread_id))
+
+    def terms(self) -> Set[str]:
+        return {self.slugs.key(sid).term for sid in self.entries}
+
+    def extract_term(self, term: str) -> Dict[str, Dict[str, int]]:
+        """Remove every entry in ``term``; returns them in JSON form."""
+        out: Dict[str, Dict[str, int]] = {}
+        for sid in [sid for sid in self.entries if self.slugs.key(sid).term == term]:
+            container_id, thread_id = self.entries.pop(sid)
+            out[self.slugs.key(sid).slug] = {"container_id": container_id, "thread_id": thread_id}
+        return out
+
+
+def deep_sizeof(*objects: object) -> int:
+    """Approximate retained size in bytes, counting shared objects once."""
+    seen: set[int] = set()
+    total = 0
+    stack: List[object] = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, (str, bytes, int, float, bool, array)) or obj is None:
+            continue
+        else:
+            for name in _slot_names(type(obj)):
+                if hasattr(obj, name):
+                    stack.append(getattr(obj, name))
+    return total
+
+
+def _slot_names(cls: type) -> Iterable[str]:
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        yield from ((slots,) if isinstance(slots, str) else slots)
@@ -5,6 +5,7 @@ from __future__ import annotations
 import os
 import pathlib
 from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -14,6 +15,8 @@ ENV_PATH = PROJECT_ROOT / ".env"
 if ENV_PATH.exists():
     load_dotenv(ENV_PATH)
 
+DEFAULT_GUILD_ID = 1432284673865682959
+
 
 def _env_flag(name: str, *, default: bool = True) -> bool:
     raw = os.getenv(name)
@@ -22,11 +25,54 @@ def _env_flag(name: str, *, default: bool = True) -> bool:
     return raw.lower() in {"1", "true", "yes", "on"}
 
 
+def _guild_env(guild_id: int, name: str) -> Optional[str]:
+    """Per-guild override, e.g. ``GUILD_1234_STUDENT_ROLE_NAME``."""
+    return os.getenv(f"GUILD_{guild_id}_{name}")
+
+
 @dataclass(frozen=True)
 class PathConfig:
     course_index: pathlib.Path
     enrollments: pathlib.Path
     users: pathlib.Path
+    course_index_bin: pathlib.Path
+    stats: pathlib.Path
+    roster: pathlib.Path
+    role_sync: pathlib.Path
+    archive_dir: pathlib.Path
+    events_dir: pathlib.Path
+    term: pathlib.Path
+
+    @classmethod
+    def in_dir(cls, root: pathlib.Path) -> "PathConfig":
+        return cls(
+            course_index=root / "course_index.json",
+            enrollments=root / "enrollments.json",
+            users=root / "users.json",
+            course_index_bin=root / "course_index.bin",
+            stats=root / "enrollment_stats.json",
+            roster=root / "roster.json",
+            role_sync=root / "role_sync.json",
+            archive_dir=root / "archive",
+            events_dir=root / "events",
+            term=root / "term.json",
+        )
+
+
+@dataclass(frozen=True)
+class GuildConfig:
+    guild_id: int
+    student_role_name: str
+    berkeley_suffix: str
+    private_containers: bool
+    default_term: str
+    paths: PathConfig
+    binary_index: bool = False
+    # Discord's cap on active threads; course threads are auto-archived near it.
+    active_thread_limit: int = 1000
+    # Limits past which new course threads go to the next container shard.
+    container_max_threads: int = 200
+    container_max_overwrites: int = 400
 
 
 @dataclass(frozen=True)
@@ -37,23 +83,127 @@ class BotConfig:
     berkeley_suffix: str
     private_containers: bool
     paths: PathConfig
+    guilds: Dict[int, GuildConfig]
+    # None: single unsharded client; 0: let Discord recommend the shard count.
+    shard_count: Optional[int] = None
+    shard_ids: Optional[Tuple[int, ...]] = None
+    leader_lock: pathlib.Path = PROJECT_ROOT / ".leader.lock"
+    # Event-loop lag that triggers a watchdog warning; 0 disables the watchdog.
+    loop_lag_warn_ms: int = 500
+    # Optional push targets for the enrollment event stream.
+    event_webhook_url: Optional[str] = None
+    event_socket: Optional[str] = None
+    # "full" caches every member; "students" caches registered students plus recent users.
+    member_cache_mode: str = "full"
+    member_cache_recent: int = 2000
+    # Admission control for enroll/drop/register: per-user token bucket (one
+    # token per course), global ceiling on concurrent actions, bounded queue.
+    admission_user_rate: float = 0.2
+    admission_user_burst: int = 20
+    admission_max_active: int = 8
+    admission_max_queue: int = 100
+
+    def guild(self, guild_id: Optional[int]) -> Optional[GuildConfig]:
+        if guild_id is None:
+            return None
+        return self.guilds.get(guild_id)
+
+    @property
+    def primary(self) -> GuildConfig:
+        return self.guilds[self.guild_id]
+
+
+def _parse_guild_ids(primary: int) -> list[int]:
+    ids = [primary]
+    for raw in os.getenv("GUILD_IDS", "").replace(";", ",").split(","):
+        raw = raw.strip()
+        if raw and int(raw) not in ids:
+            ids.append(int(raw))
+    return ids
+
+
+def _guild_config(
+    guild_id: int,
+    *,
+    primary: bool,
+    student_role_name: str,
+    berkeley_suffix: str,
+    private_containers: bool,
+    default_term: str,
+    binary_index: bool,
+    active_thread_limit: int,
+    container_max_threads: int,
+    container_max_overwrites: int,
+) -> GuildConfig:
+    # The primary guild keeps the legacy files in the project root so existing
+    # deployments don't need a migration; every other guild gets its own dir.
+    root = PROJECT_ROOT if primary else PROJECT_ROOT / "guilds" / str(guild_id)
+    return GuildConfig(
+        guild_id=guild_id,
+        student_role_name=_guild_env(guild_id, "STUDENT_ROLE_NAME") or student_role_name,
+        berkeley_suffix=_guild_env(guild_id, "BERKELEY_SUFFIX") or berkeley_suffix,
+        private_containers=_env_flag(f"GUILD_{guild_id}_PRIVATE_CONTAINERS", default=private_containers),
+        default_term=(_guild_env(guild_id, "DEFAULT_TERM") or default_term).lower(),
+        paths=PathConfig.in_dir(root),
+        binary_index=_env_flag(f"GUILD_{guild_id}_BINARY_COURSE_INDEX", default=binary_index),
+        active_thread_limit=int(_guild_env(guild_id, "ACTIVE_THREAD_LIMIT") or active_thread_limit),
+        container_max_threads=int(_guild_env(guild_id, "CONTAINER_MAX_THREADS") or container_max_threads),
+        container_max_overwrites=int(_guild_env(guild_id, "CONTAINER_MAX_OVERWRITES") or container_max_overwrites),
+    )
 
 
-def load_config() -> BotConfig:
-    token = os.getenv("DISCORD_TOKEN")
-    if not token:
+def _parse_shards() -> tuple[Optional[int], Optional[Tuple[int, ...]]]:
+    raw_count = os.getenv("SHARD_COUNT", "").strip().lower()
+    raw_ids = os.getenv("SHARD_IDS", "").strip()
+    if not raw_count:
+        if raw_ids:
+            raise RuntimeError("SHARD_IDS requires SHARD_COUNT")
+        return None, None
+    count = 0 if raw_count == "auto" else int(raw_count)
+    if not raw_ids:
+        return count, None
+    if count == 0:
+        raise RuntimeError("SHARD_IDS requires an explicit SHARD_COUNT")
+    ids = tuple(int(part) for part in raw_ids.replace(";", ",").split(",") if part.strip())
+    if any(not 0 <= shard < count for shard in ids):
+        raise RuntimeError(f"SHARD_IDS must be within 0..{count - 1}")
+    return count, ids
+
+
+def load_config(*, require_token: bool = True) -> BotConfig:
+    token = os.getenv("DISCORD_TOKEN", "")
+    if require_token and not token:
         raise RuntimeError("DISCORD_TOKEN is missing in .env")
 
-    guild_id = int(os.getenv("GUILD_ID", "1432284673865682959"))
+    guild_id = int(os.getenv("GUILD_ID", str(DEFAULT_GUILD_ID)))
     student_role_name = os.getenv("STUDENT_ROLE_NAME", "student")
     berkeley_suffix = os.getenv("BERKELEY_SUFFIX", "@berkeley.edu")
     private_containers = _env_flag("PRIVATE_CONTAINERS", default=True)
-
-    paths = PathConfig(
-        course_index=PROJECT_ROOT / "course_index.json",
-        enrollments=PROJECT_ROOT / "enrollments.json",
-        users=PROJECT_ROOT / "users.json",
-    )
+    default_term = os.getenv("DEFAULT_TERM", "fa25").lower()
+    binary_index = _env_flag("BINARY_COURSE_INDEX", default=False)
+    active_thread_limit = int(os.getenv("ACTIVE_THREAD_LIMIT", "1000"))
+    container_max_threads = int(os.getenv("CONTAINER_MAX_THREADS", "200"))
+    container_max_overwrites = int(os.getenv("CONTAINER_MAX_OVERWRITES", "400"))
+
+    guilds = {
+        gid: _guild_config(
+            gid,
+            primary=gid == guild_id,
+            student_role_name=student_role_name,
+            berkeley_suffix=berkeley_suffix,
+            private_containers=private_containers,
+            default_term=default_term,
+            binary_index=binary_index,
+            active_thread_limit=active_thread_limit,
+            container_max_threads=container_max_threads,
+            container_max_overwrites=container_max_overwrites,
+        )
+        for gid in _parse_guild_ids(guild_id)
+    }
+    shard_count, shard_ids = _parse_shards()
+    member_cache_mode = os.getenv("MEMBER_CACHE_MODE", "full").strip().lower()
+    if member_cache_mode not in ("full", "students"):
+        raise RuntimeError("MEMBER_CACHE_MODE must be 'full' or 'students'")
 
     return BotConfig(
         token=token,
@@ -61,6 +211,17 @@ def load_config() -> BotConfig:
         student_role_name=student_role_name,
         berkeley_suffix=berkeley_suffix,
         private_containers=private_containers,
-        paths=paths,
+        paths=guilds[guild_id].paths,
+        guilds=guilds,
+        shard_count=shard_count,
+        shard_ids=shard_ids,
+        loop_lag_warn_ms=int(os.getenv("LOOP_LAG_WARN_MS", "500")),
+        event_webhook_url=os.getenv("EVENT_WEBHOOK_URL") or None,
+        event_socket=os.getenv("EVENT_SOCKET") or None,
+        member_cache_mode=member_cache_mode,
+        member_cache_recent=int(os.getenv("MEMBER_CACHE_RECENT", "2000")),
+        admission_user_rate=float(os.getenv("ADMISSION_USER_RATE", "0.2")),
+        admission_user_burst=int(os.getenv("ADMISSION_USER_BURST", "20")),
+        admission_max_active=int(os.getenv("ADMISSION_MAX_ACTIVE", "8")),
+        admission_max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "100")),
     )
-
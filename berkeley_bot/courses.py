@@ -2,8 +2,10 @@
 
 from __future__ import annotations
 
+import functools
 import re
-from typing import List, Optional
+import sys
+from typing import ClassVar, Dict, List, Optional, Tuple
 
 from discord import app_commands
 
@@ -55,9 +57,12 @@ VALID_DEPTS: List[str] = [
 ]
 
 
+COURSE_CATEGORY_PREFIX = "📚 Courses"
+
+
 def course_category_name(term: Optional[str] = None) -> str:
     t = (term or state.current_term()).upper()
-    return f"📚 Courses ({t})"
+    return f"{COURSE_CATEGORY_PREFIX} ({t})"
 
 
 def archive_category_name(term: Optional[str] = None) -> str:
@@ -65,25 +70,99 @@ def archive_category_name(term: Optional[str] = None) -> str:
     return f"📦 Archived ({t})"
 
 
+_WHITESPACE = re.compile(r"\s+")
+_SLUG_PATTERN = re.compile(r"^((?:fa|sp)\d{2})-([a-z]+)-(.+)$", re.IGNORECASE)
+
+
+class CourseKey:
+    """Canonical, interned identity of a course offering: ``(term, dept, number)``.
+
+    Constructing the same course twice returns the same object, so keys compare
+    and hash by identity and the slug string is formatted exactly once. Terms
+    and departments are lower-cased and course numbers upper-cased, so ``7b``
+    and ``7B`` are the same course.
+    """
+
+    __slots__ = ("term", "dept", "number", "slug")
+
+    _interned: ClassVar[Dict[Tuple[str, str, str], "CourseKey"]] = {}
+
+    term: str
+    dept: str
+    number: str
+    slug: str
+
+    def __new__(cls, term: str, dept: str, number: str) -> "CourseKey":
+        term = term.strip().lower()
+        dept = _WHITESPACE.sub("", dept).lower()
+        number = _WHITESPACE.sub("", number).upper()
+        ident = (term, dept, number)
+        key = cls._interned.get(ident)
+        if key is None:
+            key = object.__new__(cls)
+            object.__setattr__(key, "term", sys.intern(term))
+            object.__setattr__(key, "dept", sys.intern(dept))
+            object.__setattr__(key, "number", number)
+            object.__setattr__(key, "slug", sys.intern(f"{term}-{dept}-{number}"))
+            key = cls._interned.setdefault(ident, key)
+        return key
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("CourseKey is immutable")
+
+    def __reduce__(self):
+        return CourseKey, (self.term, self.dept, self.number)
+
+    def __repr__(self) -> str:
+        return f"CourseKey({self.slug!r})"
+
+    def __str__(self) -> str:
+        return self.slug
+
+    def __lt__(self, other: "CourseKey") -> bool:
+        return (self.term, self.dept, self.number) < (other.term, other.dept, other.number)
+
+    @property
+    def dept_up(self) -> str:
+        return self.dept.upper()
+
+    @property
+    def container_name(self) -> str:
+        return container_name_for(self.dept, term=self.term)
+
+    @classmethod
+    def of(cls, dept: str, number: str, term: Optional[str] = None) -> "CourseKey":
+        return cls(term or state.current_term(), dept, number)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def parse(slug: str) -> Optional["CourseKey"]:
+        """``fa25-physics-110A`` -> ``CourseKey``; ``None`` if it isn't a course slug."""
+        m = _SLUG_PATTERN.match(slug.strip())
+        if not m:
+            return None
+        return CourseKey(m.group(1), m.group(2), m.group(3))
+
+
 def norm_course(dept: str, number: str) -> str:
-    dept_s = re.sub(r"\s+", "", dept.strip().lower())
-    num_s = re.sub(r"\s+", "", number.strip().upper())
-    return f"{dept_s}-{num_s}"
+    key = CourseKey("", dept, number)
+    return f"{key.dept}-{key.number}"
 
 
-def container_name_for(dept_up: str, term: Optional[str] = None) -> str:
+def container_name_for(dept_up: str, term: Optional[str] = None, shard: int = 1) -> str:
+    """Container channel name; shards after the first get a ``-<n>`` suffix."""
     t = (term or state.current_term()).lower()
-    return f"{dept_up.lower()}-courses-{t}"
+    base = f"{dept_up.lower()}-courses-{t}"
+    return base if shard <= 1 else f"{base}-{shard}"
 
 
 def course_slug_for(dept_up: str, number: str, term: Optional[str] = None) -> str:
-    t = (term or state.current_term()).lower()
-    return f"{t}-{norm_course(dept_up, number)}"
+    return CourseKey.of(dept_up, number, term=term).slug
 
 
 def dept_from_slug(slug: str) -> Optional[str]:
-    m = re.match(r"^(fa|sp)\d{2}-([a-z]+)-", slug.lower())
-    return m.group(2) if m else None
+    key = CourseKey.parse(slug)
+    return key.dept if key else None
 
 
 async def dept_autocomplete(interaction, current: str):
@@ -0,0 +1,143 @@
+"""Runtime diagnostics: event-loop lag watchdog and on-demand profilers."""
+
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from typing import Optional, Tuple
+
+
+log = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    """Measures event-loop scheduling lag and logs who was holding the loop.
+
+    A coroutine wakes every ``interval`` seconds and stamps a heartbeat. A
+    daemon thread watches that stamp. Once the heartbeat is ``threshold``
+    seconds overdue, the thread dumps the loop thread's current stack, which
+    is the blocking call itself, while the stall is still in progress.
+    """
+
+    def __init__(self, *, threshold: float = 0.5, interval: float = 0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._reported = False
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._tick(), name="loop-watchdog")
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - expected
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                log.warning("Event loop lagged %.0fms", lag * 1000)
+            self._heartbeat = time.monotonic()
+            self._reported = False
+
+    def _monitor(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            overdue = time.monotonic() - self._heartbeat - self.interval
+            if overdue < self.threshold or self._reported:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            # One stack per stall; the tick resets the flag once the loop runs again.
+            self._reported = True
+            stack = "".join(traceback.format_stack(frame))
+            log.warning("Event loop blocked for %.0fms so far, at:\n%s", overdue * 1000, stack)
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size; falls back to the peak where /proc isn't available."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_capture_lock = asyncio.Lock()
+
+
+async def profile_for(seconds: float, *, limit: int = 60) -> Tuple[str, bytes]:
+    """cProfile the event-loop thread for ``seconds``.
+
+    Returns a text report sorted by cumulative time and the raw ``.prof``
+    bytes, which load with ``pstats`` or snakeviz.
+    """
+    async with _capture_lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    profiler.create_stats()
+    # Same bytes Profile.dump_stats() would write to a file.
+    return out.getvalue(), marshal.dumps(profiler.stats)
+
+
+async def memory_snapshot_for(seconds: float, *, limit: int = 40) -> str:
+    """Trace allocations for ``seconds``; report growth and the largest live sites."""
+    async with _capture_lock:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(10)
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    before, after = before.filter_traces(ignore), after.filter_traces(ignore)
+    lines = [f"traced {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB) over {seconds:.0f}s", ""]
+    lines.append(f"Top {limit} growth by line:")
+    lines += [str(stat) for stat in after.compare_to(before, "lineno")[:limit]]
+    lines += ["", f"Top {limit} live allocations by line:"]
+    lines += [str(stat) for stat in after.statistics("lineno")[:limit]]
+    return "\n".join(lines) + "\n"
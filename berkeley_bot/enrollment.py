@@ -2,116 +2,360 @@
 
 from __future__ import annotations
 
-from typing import List, Tuple
+from collections import Counter
+from typing import AsyncContextManager, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
 import discord
 
 from . import courses, state
+from .courses import CourseKey
+from .events import EventLog
+from .concurrency import KeyedLocks, SingleFlight
 from .channels import (
     ensure_category,
     ensure_container_text_channel,
     ensure_private_course_thread,
     fetch_archived_thread_by_name,
+    revive_thread,
 )
+from .resilience import CircuitOpenError, call
 from .storage import DataStore
+from .threadbudget import DEFAULT_LIMIT, ThreadBudget
+from .tracing import traced
+
+
+# Called after each course in a batch with (key, ok, detail).
+ResultCallback = Callable[[CourseKey, bool, str], Awaitable[None]]
+
+T = TypeVar("T")
+
+# New courses spill into the next container shard once either limit is reached.
+DEFAULT_CONTAINER_MAX_THREADS = 200
+DEFAULT_CONTAINER_MAX_OVERWRITES = 400
 
 
 class EnrollmentService:
-    def __init__(self, store: DataStore, *, private_containers: bool):
+    def __init__(
+        self,
+        store: DataStore,
+        *,
+        events: EventLog,
+        guild_id: int,
+        private_containers: bool,
+        active_thread_limit: int = DEFAULT_LIMIT,
+        container_max_threads: int = DEFAULT_CONTAINER_MAX_THREADS,
+        container_max_overwrites: int = DEFAULT_CONTAINER_MAX_OVERWRITES,
+    ):
         self._store = store
+        self._events = events
+        self._guild_id = guild_id
         self._private_containers = private_containers
+        self._container_max_threads = container_max_threads
+        self._container_max_overwrites = container_max_overwrites
+        self.threads = ThreadBudget(active_thread_limit, on_archive=lambda t: self.thread_archived(t, reason="idle"))
+        # One enroll/drop batch at a time per user; identical concurrent requests run once.
+        self._user_locks = KeyedLocks()
+        self._flights = SingleFlight()
+        # (container_id, user_id) -> whether the user currently holds a view overwrite.
+        self._overwrites: Dict[Tuple[int, int], bool] = {}
+
+    def current_term(self) -> str:
+        return state.current_term(self._guild_id)
+
+    def course_key(self, dept: str, number: str) -> CourseKey:
+        """Key for ``dept``/``number`` in this guild's current term."""
+        return CourseKey.of(dept, number, term=self.current_term())
+
+    def user_lock(self, user_id: int) -> AsyncContextManager[None]:
+        """The lock enroll and drop hold for ``user_id``; bulk jobs take it too."""
+        return self._user_locks.hold(user_id)
+
+    async def _exclusive(
+        self, action: str, user_id: int, keys: List[CourseKey], run: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Run ``run`` holding the user's lock, sharing it with identical in-flight requests.
+
+        Duplicate callers, such as a double-submitted modal, get the first
+        caller's result but none of its ``on_result`` callbacks.
+        """
+
+        async def locked() -> T:
+            async with self._user_locks.hold(user_id):
+                return await run()
+
+        return await self._flights.do((action, user_id, frozenset(keys)), locked)
 
+    async def enroll_many(
+        self,
+        guild: discord.Guild,
+        user: discord.abc.User,
+        keys: List[CourseKey],
+        *,
+        on_result: Optional[ResultCallback] = None,
+    ) -> List[Tuple[CourseKey, bool, str]]:
+        """Enroll ``user`` in each of ``keys`` in order; returns ``(key, ok, message)`` per course."""
+
+        async def run() -> List[Tuple[CourseKey, bool, str]]:
+            outcomes = []
+            for key in keys:
+                ok, msg = await self.enroll_one(guild, user, key)
+                outcomes.append((key, ok, msg))
+                if on_result is not None:
+                    await on_result(key, ok, msg)
+            return outcomes
+
+        return await self._exclusive("enroll", user.id, keys, run)
+
+    @traced("enrollment.enroll_one")
     async def enroll_one(
         self,
         guild: discord.Guild,
         user: discord.abc.User,
-        dept_up: str,
-        number: str,
+        key: CourseKey,
     ) -> Tuple[bool, str]:
-        term = state.current_term()
-        slug = courses.course_slug_for(dept_up, number, term=term)
-        category = await ensure_category(guild, courses.course_category_name(term))
-        container_name = courses.container_name_for(dept_up, term=term)
-        container = await ensure_container_text_channel(guild, category, container_name)
-        thread = await ensure_private_course_thread(container, slug)
+        try:
+            container, thread = await self.provision(guild, key)
+        except (discord.HTTPException, CircuitOpenError) as exc:
+            return False, f"Couldn’t set up **{key.slug}**: {exc}"
+        ok, msg, added = await self.add_member(container, thread, user, key)
+        if added:
+            self._store.index_upsert(key, container.id, thread.id)
+            self._store.add_enrollment(user.id, key)
+            self._events.emit("enrolled", **_course_fields(key), user=user.id, thread_id=thread.id)
+        return ok, msg
+
+    def record_enrollments(self, pairs: List[Tuple[int, CourseKey]]) -> int:
+        """Store a batch of enrollments and emit events for the new ones in one append."""
+        added = self._store.add_enrollments(pairs)
+        self._events.emit_many(("enrolled", {**_course_fields(key), "user": uid}) for uid, key in added)
+        return len(added)
+
+    def rollover(self, current: str) -> List[str]:
+        """Archive every term but ``current``; call it on the event loop, like other store writes."""
+        archived = self._store.rollover(current)
+        for term in archived:
+            self._events.emit("term_archived", term=term)
+        return archived
+
+    @traced("enrollment.provision")
+    async def provision(
+        self, guild: discord.Guild, key: CourseKey
+    ) -> Tuple[discord.TextChannel, discord.Thread]:
+        """Create (or find) the category, container and thread for ``key``."""
+        category = await ensure_category(guild, courses.course_category_name(key.term))
+        meta = self._store.index_get(key)
+        container = guild.get_channel(int(meta["container_id"])) if meta else None
+        if isinstance(container, discord.TextChannel):
+            if container.category_id != category.id:
+                await call("channels.edit", lambda: container.edit(category=category))
+        else:
+            container = await self._place_container(guild, category, key)
+        thread_id = int(meta["thread_id"]) if meta else None
+        await self.threads.make_room(guild, keep=thread_id)
+        thread = await ensure_private_course_thread(
+            container,
+            key.slug,
+            thread_id=thread_id,
+            on_create=lambda t: self._events.emit(
+                "thread_created", **_course_fields(key), container_id=container.id, thread_id=t.id
+            ),
+        )
+        self.threads.touch(thread.id)
+        return container, thread
+
+    def thread_archived(self, thread: discord.Thread, *, reason: str) -> None:
+        """Emit an ``archived`` event for a course thread (``reason``: "admin" or "idle")."""
+        key = CourseKey.parse(thread.name)
+        if key is not None:
+            self._events.emit("archived", **_course_fields(key), thread_id=thread.id, reason=reason)
+
+    async def _place_container(
+        self, guild: discord.Guild, category: discord.CategoryChannel, key: CourseKey
+    ) -> discord.TextChannel:
+        """First shard of ``key``'s department with room for another course thread."""
+        counts = self._store.container_thread_counts(key.term)
+        shard = 1
+        while True:
+            name = courses.container_name_for(key.dept, term=key.term, shard=shard)
+            channel = discord.utils.get(guild.text_channels, name=name)
+            if channel is None or not self._container_full(channel, counts[channel.id]):
+                return await ensure_container_text_channel(guild, category, name)
+            shard += 1
 
+    def _container_full(self, channel: discord.TextChannel, threads: int) -> bool:
+        return (
+            threads >= self._container_max_threads
+            or len(channel.overwrites) >= self._container_max_overwrites
+        )
+
+    @traced("enrollment.add_member")
+    async def add_member(
+        self,
+        container: discord.TextChannel,
+        thread: discord.Thread,
+        user: discord.abc.User,
+        key: CourseKey,
+    ) -> Tuple[bool, str, bool]:
+        """Add ``user`` to a provisioned thread without touching storage.
+
+        Returns ``(ok, message, added)``; ``added`` is True only when the user
+        was newly added and the enrollment still needs recording.
+        """
+        slug = key.slug
+        self.threads.touch(thread.id)
         if self._private_containers:
-            try:
-                await container.set_permissions(user, view_channel=True, read_message_history=True)
-            except (discord.Forbidden, discord.HTTPException):
-                pass
+            await self._grant_container_access(container, user)
 
         if user in getattr(thread, "members", []):
-            return True, f"Already in <#{thread.id}> (**{slug}**)."
+            return True, f"Already in <#{thread.id}> (**{slug}**).", False
 
         try:
-            await thread.add_user(user)
-        except (discord.Forbidden, discord.HTTPException) as exc:
-            return False, f"Failed to add to **{slug}**: {exc}"
-
-        self._store.index_upsert(slug, container.id, thread.id)
-        self._store.add_enrollment(user.id, slug)
-        return True, f"Joined <#{thread.id}> (**{slug}**)."
+            await call("threads.members", lambda: thread.add_user(user))
+        except (discord.Forbidden, discord.HTTPException, CircuitOpenError) as exc:
+            return False, f"Failed to add to **{slug}**: {exc}", False
+        return True, f"Joined <#{thread.id}> (**{slug}**).", True
 
     async def drop_many(
         self,
         guild: discord.Guild,
         user: discord.abc.User,
-        slugs: List[str],
-    ) -> Tuple[List[str], List[str]]:
-        success, failures = [], []
-        term = state.current_term()
-        for slug in slugs:
-            thread = await self._resolve_thread(guild, slug)
+        keys: List[CourseKey],
+        *,
+        on_result: Optional[ResultCallback] = None,
+    ) -> Tuple[List[CourseKey], List[str]]:
+        return await self._exclusive(
+            "drop", user.id, keys, lambda: self._drop_many(guild, user, keys, on_result)
+        )
+
+    @traced("enrollment.drop_many")
+    async def _drop_many(
+        self,
+        guild: discord.Guild,
+        user: discord.abc.User,
+        keys: List[CourseKey],
+        on_result: Optional[ResultCallback],
+    ) -> Tuple[List[CourseKey], List[str]]:
+        success: List[CourseKey] = []
+        failures: List[str] = []
+        dept_counts: Dict[str, Counter] = {}
+        for key in keys:
+            counts = dept_counts.get(key.term)
+            if counts is None:
+                counts = dept_counts[key.term] = Counter(self._store.dept_totals_for_term(user.id, key.term))
+            thread = await self._resolve_thread(guild, key)
             if not thread:
-                self._store.remove_enrollment(user.id, slug)
-                failures.append(f"{slug} (not found)")
+                if self._store.remove_enrollment(user.id, key):
+                    self._events.emit("dropped", **_course_fields(key), user=user.id, reason="thread missing")
+                    counts[key.dept] -= 1
+                failures.append(f"{key.slug} (not found)")
+                if on_result is not None:
+                    await on_result(key, False, failures[-1])
                 continue
             try:
-                await thread.remove_user(user)
-            except (discord.Forbidden, discord.HTTPException) as exc:
-                failures.append(f"{slug} (failed: {exc})")
+                await call("threads.members", lambda: thread.remove_user(user))
+            except (discord.Forbidden, discord.HTTPException, CircuitOpenError) as exc:
+                failures.append(f"{key.slug} (failed: {exc})")
+                if on_result is not None:
+                    await on_result(key, False, failures[-1])
                 continue
 
-            self._store.remove_enrollment(user.id, slug)
-            success.append(slug)
-
-            if self._private_containers:
-                dept = courses.dept_from_slug(slug)
-                if dept:
-                    remaining = self._store.courses_by_term_and_dept(user.id, term, dept)
-                    if not remaining:
-                        container_name = courses.container_name_for(dept.upper(), term=term)
-                        container = discord.utils.get(guild.text_channels, name=container_name)
-                        if container:
-                            try:
-                                await container.set_permissions(user, overwrite=None)
-                            except (discord.Forbidden, discord.HTTPException):
-                                pass
+            # Only a course the user actually held lowers their department total.
+            if self._store.remove_enrollment(user.id, key):
+                self._events.emit("dropped", **_course_fields(key), user=user.id)
+                counts[key.dept] -= 1
+            success.append(key)
+            if on_result is not None:
+                await on_result(key, True, key.slug)
+
+            container = thread.parent
+            if (
+                self._private_containers
+                and isinstance(container, discord.TextChannel)
+                and not self._uses_container(user.id, key, container.id, counts[key.dept])
+            ):
+                await self._revoke_container_access(container, user)
         return success, failures
 
-    async def _resolve_thread(self, guild: discord.Guild, slug: str) -> discord.Thread | None:
-        meta = self._store.index_get(slug)
+    def _uses_container(self, user_id: int, key: CourseKey, container_id: int, dept_total: int) -> bool:
+        """Whether the user still holds a ``key.dept`` course placed in ``container_id``."""
+        if dept_total <= 0:
+            return False
+        for other in self._store.courses_by_term_and_dept(user_id, key.term, key.dept):
+            meta = self._store.index_get(other)
+            # Unknown placement: keep access rather than lock the student out.
+            if meta is None or int(meta["container_id"]) == container_id:
+                return True
+        return False
+
+    def _has_container_access(self, container: discord.TextChannel, user: discord.abc.User) -> bool:
+        key = (container.id, user.id)
+        cached = self._overwrites.get(key)
+        if cached is None:
+            # Seed from the gateway's cached overwrites; this never hits REST.
+            cached = bool(container.overwrites_for(discord.Object(id=user.id)).view_channel)
+            self._overwrites[key] = cached
+        return cached
+
+    async def _grant_container_access(self, container: discord.TextChannel, user: discord.abc.User) -> None:
+        if self._has_container_access(container, user):
+            return
+        try:
+            await call(
+                "channels.permissions",
+                lambda: container.set_permissions(user, view_channel=True, read_message_history=True),
+            )
+        except (discord.Forbidden, discord.HTTPException, CircuitOpenError):
+            return
+        self._overwrites[(container.id, user.id)] = True
+
+    async def _revoke_container_access(self, container: discord.TextChannel, user: discord.abc.User) -> None:
+        if not self._has_container_access(container, user):
+            return
+        try:
+            await call("channels.permissions", lambda: container.set_permissions(user, overwrite=None))
+        except (discord.Forbidden, discord.HTTPException, CircuitOpenError):
+            return
+        self._overwrites[(container.id, user.id)] = False
+
+    async def _resolve_thread(self, guild: discord.Guild, key: CourseKey) -> discord.Thread | None:
+        meta = self._store.index_get(key)
         if meta:
-            thread = guild.get_channel(int(meta["thread_id"]))
-            if isinstance(thread, discord.Thread):
+            thread_id = int(meta["thread_id"])
+            thread = guild.get_thread(thread_id)
+            if thread is not None:
+                self.threads.touch(thread.id)
                 return thread
-            try:
-                fetched = await guild.fetch_channel(int(meta["thread_id"]))
-            except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-                fetched = None
-            if isinstance(fetched, discord.Thread):
-                return fetched
-
-        dept = courses.dept_from_slug(slug)
-        if not dept:
-            return None
-        container_name = courses.container_name_for(dept.upper(), term=state.current_term())
-        container = discord.utils.get(guild.text_channels, name=container_name)
-        if not container:
+            # Members can only be removed from active threads, so revive instead of fetching.
+            revived = await self._revive(guild, thread_id)
+            if revived is not None:
+                return revived
+
+        # Not indexed: search every shard of the department by name.
+        shard = 1
+        while True:
+            name = courses.container_name_for(key.dept, term=key.term, shard=shard)
+            container = discord.utils.get(guild.text_channels, name=name)
+            if container is None:
+                return None
+            for thread in container.threads:
+                if thread.name == key.slug:
+                    return thread
+            archived = await fetch_archived_thread_by_name(container, key.slug)
+            if archived is not None:
+                return await self._revive(guild, archived.id)
+            shard += 1
+
+    async def _revive(self, guild: discord.Guild, thread_id: int) -> discord.Thread | None:
+        # Drops only need the thread active to remove the member; keep an admin's /archive lock.
+        await self.threads.make_room(guild, keep=thread_id)
+        try:
+            thread = await revive_thread(guild, thread_id, unlock=False)
+        except (discord.Forbidden, discord.HTTPException, CircuitOpenError):
             return None
-        for thread in container.threads:
-            if thread.name == slug:
-                return thread
-        return await fetch_archived_thread_by_name(container, slug)
+        if thread is not None:
+            self.threads.touch(thread.id)
+        return thread
+
 
+def _course_fields(key: CourseKey) -> Dict[str, str]:
+    return {"course": key.slug, "term": key.term, "dept": key.dept}
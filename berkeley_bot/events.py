@@ -0,0 +1,306 @@
+"""Append-only enrollment event stream.
+
+The services append one JSON line per change to ``events/<base offset>.ndjson``:
+registered, unregistered, enrolled, dropped, thread_created, archived (a
+course thread) and term_archived.
+Each event carries a gap-free ``offset``. A segment rolls over once it passes
+``SEGMENT_BYTES``, and the new file is named after the first offset it holds,
+so a reader can find any offset from the file names alone.
+
+Consumers keep a durable offset per name under ``events/consumers/``. They see
+each event at least once, and they re-read only what changed rather than the
+whole ``enrollments.json``::
+
+    consumer = EventConsumer(EventLog(path), "dashboard")
+    for event in consumer.poll():
+        handle(event)
+    consumer.commit()
+
+The bot can also push new events to a local webhook or Unix socket; see
+:class:`EventPusher`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import pathlib
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from .locking import FileLock
+
+
+log = logging.getLogger(__name__)
+
+SUFFIX = ".ndjson"
+SEGMENT_BYTES = 4 * 1024 * 1024
+TAIL_CHUNK = 64 * 1024
+
+EVENT_TYPES = (
+    "registered", "unregistered", "enrolled", "dropped", "thread_created", "archived", "term_archived",
+)
+
+
+def segment_name(base: int) -> str:
+    return f"{base:020d}{SUFFIX}"
+
+
+@dataclass
+class Cursor:
+    """Byte position of ``offset`` inside ``path``; lets a reader resume without rescanning."""
+
+    path: pathlib.Path
+    position: int
+    offset: int
+
+
+class EventLog:
+    def __init__(
+        self,
+        directory: pathlib.Path,
+        *,
+        guild_id: Optional[int] = None,
+        segment_bytes: int = SEGMENT_BYTES,
+    ):
+        self.directory = directory
+        self.guild_id = guild_id
+        self.segment_bytes = segment_bytes
+        self._lock = FileLock(directory / ".append.lock")
+        # (segment, size, next offset) after our last append; skips the tail scan.
+        self._head: Optional[Tuple[pathlib.Path, int, int]] = None
+
+    def segments(self) -> List[Tuple[int, pathlib.Path]]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            (int(name[: -len(SUFFIX)]), self.directory / name)
+            for name in names
+            if name.endswith(SUFFIX) and name[: -len(SUFFIX)].isdigit()
+        )
+
+    # ------------ writes ------------
+    def emit(self, type: str, **fields: Any) -> Optional[int]:
+        """Append one event; returns its offset, or None if the log couldn't be written."""
+        offsets = self.emit_many([(type, fields)])
+        return offsets[0] if offsets else None
+
+    def emit_many(self, events: Iterable[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """Like :meth:`append`, but logs instead of raising.
+
+        Event logging must never fail the enrollment that triggered it.
+        """
+        try:
+            return self.append(events)
+        except OSError:
+            log.warning("Could not append events to %s", self.directory, exc_info=True)
+            return []
+
+    def append(self, events: Iterable[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            path, size, offset = self._tail()
+            if path is None or size >= self.segment_bytes:
+                path, size = self.directory / segment_name(offset), 0
+            offsets: List[int] = []
+            lines: List[str] = []
+            now = round(time.time(), 3)
+            for type, fields in events:
+                record = {"offset": offset, "ts": now, "type": type, "guild": self.guild_id, **fields}
+                lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                offsets.append(offset)
+                offset += 1
+            if not lines:
+                return offsets
+            data = "".join(lines).encode("utf-8")
+            ours = self._head is not None and self._head[:2] == (path, size)
+            if size and not ours and not _ends_with_newline(path):
+                # A writer died mid-line; terminate it so our first record stays parseable.
+                data = b"\n" + data
+            with path.open("ab") as fh:
+                fh.write(data)
+            self._head = (path, size + len(data), offset)
+        return offsets
+
+    def _tail(self) -> Tuple[Optional[pathlib.Path], int, int]:
+        """Current segment, its size and the next offset; re-scanned only if another process wrote."""
+        segments = self.segments()
+        if not segments:
+            return None, 0, 0
+        base, path = segments[-1]
+        size = path.stat().st_size
+        if self._head is not None and self._head[0] == path and self._head[1] == size:
+            return path, size, self._head[2]
+        last = _last_offset(path, size)
+        return path, size, base if last is None else last + 1
+
+    # ------------ reads ------------
+    def read(self, offset: int, limit: int = 500, cursor: Optional[Cursor] = None) -> Tuple[List[dict], Optional[Cursor]]:
+        """Up to ``limit`` events from ``offset`` on, plus a cursor for the next call."""
+        if cursor is not None and cursor.offset == offset:
+            path, position = cursor.path, cursor.position
+        else:
+            segments = self.segments()
+            if not segments:
+                return [], None
+            bases = [base for base, _ in segments]
+            # Last segment starting at or before ``offset``.
+            path, position = segments[max(0, bisect.bisect_right(bases, offset) - 1)][1], 0
+
+        events: List[dict] = []
+        while True:
+            try:
+                fh = path.open("rb")
+            except FileNotFoundError:
+                break
+            with fh:
+                fh.seek(position)
+                while len(events) < limit:
+                    raw = fh.readline()
+                    if not raw.endswith(b"\n"):
+                        break  # End of file, or a line still being written.
+                    position += len(raw)
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        continue
+                    if record.get("offset", -1) < offset:
+                        continue
+                    events.append(record)
+                    offset = record["offset"] + 1
+            if len(events) >= limit:
+                break
+            later = [p for base, p in self.segments() if p.name > path.name]
+            if not later or path.stat().st_size > position:
+                break
+            path, position = later[0], 0
+        return events, Cursor(path, position, offset)
+
+
+def _ends_with_newline(path: pathlib.Path) -> bool:
+    with path.open("rb") as fh:
+        fh.seek(-1, os.SEEK_END)
+        return fh.read(1) == b"\n"
+
+
+def _last_offset(path: pathlib.Path, size: int) -> Optional[int]:
+    with path.open("rb") as fh:
+        fh.seek(max(0, size - TAIL_CHUNK))
+        lines = fh.read().split(b"\n")
+    for raw in reversed(lines):
+        try:
+            return int(json.loads(raw)["offset"])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return None
+
+
+class EventConsumer:
+    """A named reader whose committed offset survives restarts."""
+
+    def __init__(self, log: EventLog, name: str):
+        self._log = log
+        self.name = name
+        self._path = log.directory / "consumers" / f"{name}.json"
+        self.committed = self._load()
+        self.position = self.committed
+        self._cursor: Optional[Cursor] = None
+
+    def _load(self) -> int:
+        try:
+            with self._path.open("r", encoding="utf-8") as fh:
+                return int(json.load(fh).get("offset", 0))
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def poll(self, max_events: int = 500) -> List[dict]:
+        events, self._cursor = self._log.read(self.position, max_events, self._cursor)
+        if events:
+            self.position = events[-1]["offset"] + 1
+        return events
+
+    def commit(self) -> None:
+        """Persist the position after the last polled event."""
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump({"offset": self.position, "updated": round(time.time(), 3)}, fh)
+        tmp.replace(self._path)
+        self.committed = self.position
+
+    def seek(self, offset: int) -> None:
+        self.position = offset
+        self._cursor = None
+
+
+class EventPusher:
+    """Delivers new events to a local webhook and/or Unix socket.
+
+    Uses the ``push`` consumer, so delivery resumes where it left off after a
+    restart. Events are committed only once every target accepted the batch.
+    With several bot processes, only the one for which ``active()`` is true
+    (the leader) pushes.
+    """
+
+    def __init__(
+        self,
+        logs: List[EventLog],
+        *,
+        url: Optional[str] = None,
+        socket_path: Optional[str] = None,
+        active: Callable[[], bool] = lambda: True,
+        interval: float = 1.0,
+        batch: int = 200,
+    ):
+        self._consumers = [EventConsumer(log, "push") for log in logs]
+        self._url = url
+        self._socket_path = socket_path
+        self._active = active
+        self._interval = interval
+        self._batch = batch
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and (self._url or self._socket_path):
+            self._task = asyncio.create_task(self._run(), name="event-push")
+
+    async def _run(self) -> None:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            while True:
+                delivered = 0
+                if self._active():
+                    for consumer in self._consumers:
+                        delivered += await self._drain(session, consumer)
+                if not delivered:
+                    await asyncio.sleep(self._interval)
+
+    async def _drain(self, session: aiohttp.ClientSession, consumer: EventConsumer) -> int:
+        start = consumer.position
+        events = await asyncio.to_thread(consumer.poll, self._batch)
+        if not events:
+            return 0
+        try:
+            if self._url:
+                async with session.post(self._url, json={"events": events}) as resp:
+                    resp.raise_for_status()
+            if self._socket_path:
+                _, writer = await asyncio.open_unix_connection(self._socket_path)
+                writer.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events).encode("utf-8"))
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as exc:
+            log.warning("Event push failed at offset %d: %s", start, exc)
+            consumer.seek(start)
+            await asyncio.sleep(self._interval * 5)
+            return 0
+        await asyncio.to_thread(consumer.commit)
+        return len(events)
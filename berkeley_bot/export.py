@@ -0,0 +1,152 @@
+"""Streaming roster/enrollment export.
+
+Rows are produced one enrollment at a time and serialised by generators, so an
+export never holds more than one user's courses plus one output chunk.
+:func:`export_parts` runs on the event loop, which owns the store, and yields
+to it every ``EXPORT_BATCH`` rows.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import tempfile
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+from .storage import DataStore
+
+
+FIELDS = ["term", "dept", "number", "slug", "user_id", "name", "email", "student_id"]
+FORMATS = {"csv": "csv", "ndjson": "ndjson"}
+# Stay under Discord's default 10 MiB per-message upload limit; send one part per message.
+DEFAULT_PART_BYTES = 8 * 1024 * 1024
+SPOOL_BYTES = 1024 * 1024
+EXPORT_BATCH = 500
+
+
+def iter_enrollment_rows(
+    store: DataStore,
+    *,
+    term: Optional[str] = None,
+    dept: Optional[str] = None,
+) -> Iterator[Dict[str, str]]:
+    term = term.lower() if term else None
+    dept = dept.lower() if dept else None
+    for uid, keys in store.iter_enrollments(term):
+        user: Optional[Dict[str, str]] = None
+        for key in keys:
+            if (term and key.term != term) or (dept and key.dept != dept):
+                continue
+            if user is None:
+                user = store.user_get(uid) or {}
+            yield {
+                "term": key.term,
+                "dept": key.dept_up,
+                "number": key.number,
+                "slug": key.slug,
+                "user_id": str(uid),
+                "name": user.get("name", ""),
+                "email": user.get("email", ""),
+                "student_id": user.get("student_id", ""),
+            }
+
+
+def iter_csv(rows: Iterable[Dict[str, str]], *, header: bool = True) -> Iterator[str]:
+    if header:
+        yield csv_header()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS, lineterminator="\n")
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_ndjson(rows: Iterable[Dict[str, str]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def iter_export(rows: Iterable[Dict[str, str]], fmt: str, *, header: bool = True) -> Iterator[str]:
+    if fmt == "csv":
+        return iter_csv(rows, header=header)
+    if fmt == "ndjson":
+        return iter_ndjson(rows)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+class PartSpooler:
+    """Packs text chunks into spooled files of at most ``part_bytes`` each.
+
+    Each part spills to disk past ``SPOOL_BYTES`` and starts with ``header``,
+    so every file stands on its own. An empty export still yields one part.
+    """
+
+    def __init__(self, *, part_bytes: int = DEFAULT_PART_BYTES, header: str = ""):
+        self._part_bytes = part_bytes
+        self._header = header.encode("utf-8")
+        self._part: Optional[IO[bytes]] = None
+        self._size = 0
+
+    def write(self, chunk: str) -> Optional[IO[bytes]]:
+        """Add ``chunk``; returns the previous part, rewound, if this chunk started a new one."""
+        data = chunk.encode("utf-8")
+        full = None
+        if self._part is not None and self._size + len(data) > self._part_bytes:
+            full, self._part = self._part, None
+            full.seek(0)
+        if self._part is None:
+            self._part = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+            self._size = self._part.write(self._header)
+        self._size += self._part.write(data)
+        return full
+
+    def close(self) -> IO[bytes]:
+        """The last part, rewound."""
+        part, self._part = self._part, None
+        if part is None:
+            part = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+            part.write(self._header)
+        part.seek(0)
+        return part
+
+
+def csv_header() -> str:
+    return ",".join(FIELDS) + "\n"
+
+
+def part_filenames(stem: str, fmt: str, count: int) -> List[str]:
+    ext = FORMATS[fmt]
+    if count == 1:
+        return [f"{stem}.{ext}"]
+    return [f"{stem}-part{i + 1}.{ext}" for i in range(count)]
+
+
+async def export_parts(
+    store: DataStore,
+    fmt: str,
+    *,
+    term: Optional[str] = None,
+    dept: Optional[str] = None,
+    part_bytes: int = DEFAULT_PART_BYTES,
+) -> List[IO[bytes]]:
+    """Spool the export into parts on the event loop, yielding every ``EXPORT_BATCH`` rows."""
+    rows = iter_enrollment_rows(store, term=term, dept=dept)
+    spooler = PartSpooler(part_bytes=part_bytes, header=csv_header() if fmt == "csv" else "")
+    parts: List[IO[bytes]] = []
+    try:
+        for count, chunk in enumerate(iter_export(rows, fmt, header=False), start=1):
+            full = spooler.write(chunk)
+            if full is not None:
+                parts.append(full)
+            if count % EXPORT_BATCH == 0:
+                await asyncio.sleep(0)
+        parts.append(spooler.close())
+    except BaseException:
+        for part in parts:
+            part.close()
+        raise
+    return parts
@@ -0,0 +1,58 @@
+"""Leader election between bot processes that share one data directory."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import pathlib
+from typing import Awaitable, Callable, Optional
+
+from .locking import FileLock
+
+
+log = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """Holds an exclusive lock file for as long as this process is leader.
+
+    The OS drops the lock when the process exits, so a standby process picks
+    up leadership on its next retry without any lease bookkeeping.
+    """
+
+    def __init__(self, path: pathlib.Path, *, retry_interval: float = 15.0):
+        self._lock = FileLock(path)
+        self._retry_interval = retry_interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock.held
+
+    def try_acquire(self) -> bool:
+        if self._lock.held:
+            return True
+        if self._lock.acquire(blocking=False):
+            log.info("Acquired leadership (%s)", self._lock.path)
+            return True
+        return False
+
+    def start(self) -> None:
+        """Campaign in the background until this process becomes leader."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._campaign())
+
+    async def _campaign(self) -> None:
+        while not self.try_acquire():
+            await asyncio.sleep(self._retry_interval)
+
+    async def run_singleton(self, name: str, job: Callable[[], Awaitable[None]]) -> bool:
+        """Run ``job`` only on the leader; returns whether it ran here."""
+        if not self.try_acquire():
+            log.debug("Skipping %s: not the leader", name)
+            return False
+        await job()
+        return True
+
+    def resign(self) -> None:
+        self._lock.release()
@@ -0,0 +1,90 @@
+"""Cross-process file locks for processes sharing one data directory."""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import time
+from typing import IO, Optional
+
+if os.name == "nt":  # pragma: no cover - exercised on Windows hosts only
+    import msvcrt
+
+    def _lock(fh: IO[bytes], *, blocking: bool) -> bool:
+        while True:
+            fh.seek(0)
+            try:
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.05)
+
+    def _unlock(fh: IO[bytes]) -> None:
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _lock(fh: IO[bytes], *, blocking: bool) -> bool:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(fh.fileno(), flags)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _unlock(fh: IO[bytes]) -> None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+class FileLock:
+    """Exclusive advisory lock on ``path``; re-entrant within one process."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._fh: Optional[IO[bytes]] = None
+        self._depth = 0
+
+    @property
+    def held(self) -> bool:
+        return self._fh is not None
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if self._fh is not None:
+            self._depth += 1
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fh = open(self.path, "a+b")
+        if not _lock(fh, blocking=blocking):
+            fh.close()
+            return False
+        self._fh = fh
+        self._depth = 1
+        return True
+
+    def release(self) -> None:
+        if self._fh is None:
+            return
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        fh, self._fh = self._fh, None
+        try:
+            _unlock(fh)
+        finally:
+            fh.close()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def lock_path_for(path: pathlib.Path) -> pathlib.Path:
+    return path.with_suffix(path.suffix + ".lock")
+
@@ -0,0 +1,134 @@
+"""Member-cache policy for large guilds.
+
+``MEMBER_CACHE_MODE=full`` (the default) keeps discord.py's behaviour: every
+member is chunked at startup and cached for the life of the process.
+
+``MEMBER_CACHE_MODE=students`` turns off startup chunking and automatic
+caching. The cache then holds only:
+
+* registered students, loaded in batches of 100 in the background after
+  login (``query_members(user_ids=...)``), and
+* members who recently interacted with the bot, in an LRU of
+  ``MEMBER_CACHE_RECENT`` entries.
+
+Anything else is fetched on demand. Jobs that need whole-guild member lists
+(for example a role-sync revoke) chunk the guild on demand and :meth:`trim`
+it back afterwards.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+
+log = logging.getLogger(__name__)
+
+MODES = ("full", "students")
+DEFAULT_RECENT = 2000
+# Discord accepts at most 100 user ids per member request.
+QUERY_BATCH = 100
+
+
+class MemberCache:
+    def __init__(self, mode: str = "full", *, recent_size: int = DEFAULT_RECENT):
+        if mode not in MODES:
+            raise ValueError(f"Unknown member cache mode: {mode}")
+        self.mode = mode
+        self.recent_size = recent_size
+        # Members for which this returns True are never evicted (registered students).
+        self.keep: Callable[[discord.Member], bool] = lambda member: False
+        self._recent: "OrderedDict[Tuple[int, int], discord.Guild]" = OrderedDict()
+
+    @property
+    def lazy(self) -> bool:
+        return self.mode == "students"
+
+    def client_options(self) -> Dict[str, Any]:
+        """Extra ``commands.Bot`` keyword arguments for this mode."""
+        if not self.lazy:
+            return {}
+        return {"chunk_guilds_at_startup": False, "member_cache_flags": discord.MemberCacheFlags.none()}
+
+    # ------------ recency ------------
+    def touch(self, member: discord.abc.User) -> None:
+        """Cache an interacting member and evict the least recently active one past the limit."""
+        if not self.lazy or not isinstance(member, discord.Member):
+            return
+        guild = member.guild
+        if guild.get_member(member.id) is None:
+            guild._add_member(member)
+        key = (guild.id, member.id)
+        self._recent[key] = guild
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.recent_size:
+            (_, user_id), old_guild = self._recent.popitem(last=False)
+            self._evict(old_guild, user_id)
+
+    def _evict(self, guild: discord.Guild, user_id: int) -> bool:
+        member = guild.get_member(user_id)
+        if member is None or member.id == guild.me.id or self.keep(member):
+            return False
+        guild._remove_member(member)
+        return True
+
+    # ------------ on-demand loading ------------
+    async def get(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        return (await self.ensure(guild, [user_id])).get(user_id)
+
+    async def ensure(self, guild: discord.Guild, user_ids: Iterable[int]) -> Dict[int, discord.Member]:
+        """Members of ``guild`` among ``user_ids``, loading uncached ones in batches.
+
+        Loaded members that :attr:`keep` doesn't protect count as recently
+        active, so the LRU may evict them later. Hold on to the returned
+        objects rather than re-reading the cache.
+        """
+        found: Dict[int, discord.Member] = {}
+        missing: List[int] = []
+        for uid in dict.fromkeys(user_ids):
+            member = guild.get_member(uid)
+            if member is not None:
+                found[uid] = member
+            else:
+                missing.append(uid)
+        if not self.lazy:
+            return found
+        for start in range(0, len(missing), QUERY_BATCH):
+            batch = missing[start:start + QUERY_BATCH]
+            try:
+                members = await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+            except asyncio.TimeoutError:
+                log.warning("Member query timed out in %s (%d ids)", guild.id, len(batch))
+                continue
+            for member in members:
+                found[member.id] = member
+                if not self.keep(member):
+                    self.touch(member)
+        return found
+
+    async def chunk(self, guild: discord.Guild) -> None:
+        """Cache every member of ``guild`` for a job that needs it; pair with :meth:`trim`."""
+        if not guild.chunked:
+            await guild.chunk(cache=True)
+
+    def trim(self, guild: discord.Guild) -> int:
+        """Drop cached members that are neither kept nor recently active."""
+        if not self.lazy:
+            return 0
+        removed = 0
+        for member in list(guild.members):
+            if (guild.id, member.id) not in self._recent and self._evict(guild, member.id):
+                removed += 1
+        return removed
+
+    def report(self, guilds: List[discord.Guild]) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "cached": sum(len(guild.members) for guild in guilds),
+            "total": sum(guild.member_count or 0 for guild in guilds),
+            "recent": len(self._recent),
+        }
@@ -6,10 +6,10 @@ import discord
 
 from discord import app_commands
 
-from .registration import RegistrationService
+from .tenancy import TenantRegistry
 
 
-def require_student(registration: RegistrationService):
+def require_student(tenants: TenantRegistry):
     async def predicate(interaction: discord.Interaction) -> bool:
         if not interaction.guild:
             await interaction.response.send_message(
@@ -20,6 +20,7 @@ def require_student(registration: RegistrationService):
         member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(
             interaction.user.id
         )
+        registration = tenants.resolve(interaction).registration
         if not member or not registration.member_has_student(member):
             await interaction.response.send_message(
                 "🔒 You need the student role. Register with `/register ...` (you can run it in DM).",
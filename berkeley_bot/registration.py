@@ -2,23 +2,61 @@
 
 from __future__ import annotations
 
+import asyncio
+import csv
+import io
 import re
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
 import discord
 from discord.ext import commands
 
-from .config import BotConfig
+from .config import GuildConfig
+from .events import EventLog
+from .resilience import CircuitOpenError, call
 from .storage import DataStore
+from .tracing import traced
 
 
 SID_PATTERN = re.compile(r"^\d{10}$")
+ROSTER_SID_COLUMNS = {"student_id", "student id", "sid", "studentid"}
+ROSTER_EMAIL_COLUMNS = {"email", "email address", "berkeley email"}
+
+
+def parse_roster_csv(text: str) -> Tuple[Dict[str, str], int]:
+    """Read an official roster into ``{sid: email}``; returns it and the skipped row count.
+
+    Headers are matched loosely (``SID``, ``Student ID``, ``Email``...). Without
+    a recognised header the first two columns are taken as SID and email.
+    """
+    rows = csv.reader(io.StringIO(text))
+    first = next(rows, None)
+    if first is None:
+        return {}, 0
+    header = [cell.strip().lower() for cell in first]
+    sid_col = next((i for i, name in enumerate(header) if name in ROSTER_SID_COLUMNS), None)
+    email_col = next((i for i, name in enumerate(header) if name in ROSTER_EMAIL_COLUMNS), None)
+    if sid_col is None:
+        sid_col, email_col = 0, 1
+        rows = iter([first, *rows])
+    students: Dict[str, str] = {}
+    skipped = 0
+    for row in rows:
+        sid = row[sid_col].strip() if sid_col < len(row) else ""
+        if not SID_PATTERN.fullmatch(sid):
+            skipped += 1
+            continue
+        email = row[email_col].strip() if email_col is not None and email_col < len(row) else ""
+        students[sid] = email.lower()
+    return students, skipped
 
 
 class RegistrationService:
-    def __init__(self, store: DataStore, config: BotConfig):
+    def __init__(self, store: DataStore, config: GuildConfig, *, events: EventLog):
         self._store = store
         self._config = config
+        self._events = events
+        self._role_id: Optional[int] = None
 
     @property
     def student_role_name(self) -> str:
@@ -33,62 +71,104 @@ class RegistrationService:
         trimmed = name.strip()
         if not (1 <= len(trimmed) <= 50):
             return "Name length must be between 1 and 50 characters."
+        return self.check_roster(student_id, email)
+
+    def check_roster(self, student_id: str, email: str) -> Optional[str]:
+        """Match against the imported roster; every SID passes while none is loaded."""
+        if not self._store.roster_size():
+            return None
+        expected = self._store.roster_email(student_id)
+        if expected is None:
+            return "SID is not on the official roster."
+        if expected and expected != email.lower():
+            return "Email does not match the roster entry for this SID."
         return None
 
+    async def import_roster(self, text: str, *, replace: bool = True) -> Tuple[int, int]:
+        """Load a roster CSV; returns (students on the roster, rows skipped).
+
+        Parsing runs off the loop; the store is updated on it.
+        """
+        students, skipped = await asyncio.to_thread(parse_roster_csv, text)
+        return self._store.roster_import(students, replace=replace), skipped
+
     # ------------ Persistence ------------
     def user_get(self, uid: int) -> Optional[dict]:
         return self._store.user_get(uid)
 
     def user_upsert(self, uid: int, student_id: str, email: str, name: str) -> None:
         self._store.user_upsert(uid, student_id, email.lower(), name.strip())
+        self._events.emit("registered", user=uid, student_id=student_id, email=email.lower(), name=name.strip())
 
     def user_delete(self, uid: int) -> None:
+        existed = self._store.user_get(uid) is not None
         self._store.user_delete(uid)
+        if existed:
+            self._events.emit("unregistered", user=uid)
 
     # ------------ Roles ------------
+    def student_role(self, guild: discord.Guild) -> Optional[discord.Role]:
+        # Look the role up by id once it is known; fall back to a name scan if
+        # it was deleted or renamed.
+        role = guild.get_role(self._role_id) if self._role_id else None
+        if role is None or role.name != self._config.student_role_name:
+            role = discord.utils.get(guild.roles, name=self._config.student_role_name)
+            self._role_id = role.id if role else None
+        return role
+
+    @traced("registration.ensure_student_role")
     async def ensure_student_role(self, guild: discord.Guild) -> discord.Role:
-        role = discord.utils.get(guild.roles, name=self._config.student_role_name)
+        role = self.student_role(guild)
         if role:
             return role
-        return await guild.create_role(
-            name=self._config.student_role_name,
-            mentionable=False,
-            reason="bootstrap student role",
+        role = await call(
+            "roles.create",
+            lambda: guild.create_role(
+                name=self._config.student_role_name,
+                mentionable=False,
+                reason="bootstrap student role",
+            ),
+            idempotent=False,
         )
+        self._role_id = role.id
+        return role
 
     def member_has_student(self, member: discord.Member) -> bool:
         return any(r.name == self._config.student_role_name for r in member.roles)
 
+    @traced("registration.grant_student_role")
     async def grant_student_role(self, guild: discord.Guild, user_id: int) -> bool:
-        role = await self.ensure_student_role(guild)
         try:
-            member = await guild.fetch_member(user_id)
-        except (discord.NotFound, discord.HTTPException, discord.Forbidden):
+            role = await self.ensure_student_role(guild)
+            member = await call("members.fetch", lambda: guild.fetch_member(user_id))
+        except (discord.NotFound, discord.HTTPException, discord.Forbidden, CircuitOpenError):
             return False
         if self.member_has_student(member):
             return True
         try:
-            await member.add_roles(role, reason="registration approved")
+            await call("members.roles", lambda: member.add_roles(role, reason="registration approved"))
             return True
-        except (discord.Forbidden, discord.HTTPException):
+        except (discord.Forbidden, discord.HTTPException, CircuitOpenError):
             return False
 
+    @traced("registration.remove_student_role")
     async def remove_student_role(self, guild: discord.Guild, user_id: int) -> None:
-        role = discord.utils.get(guild.roles, name=self._config.student_role_name)
+        role = self.student_role(guild)
         if not role:
             return
         try:
-            member = await guild.fetch_member(user_id)
-        except (discord.NotFound, discord.HTTPException, discord.Forbidden):
+            member = await call("members.fetch", lambda: guild.fetch_member(user_id))
+        except (discord.NotFound, discord.HTTPException, discord.Forbidden, CircuitOpenError):
             return
         if role not in member.roles:
             return
         try:
-            await member.remove_roles(role, reason="unregister")
-        except (discord.Forbidden, discord.HTTPException):
+            await call("members.roles", lambda: member.remove_roles(role, reason="unregister"))
+        except (discord.Forbidden, discord.HTTPException, CircuitOpenError):
             return
 
     # ------------ Workflow ------------
+    @traced("registration.register_user")
     async def register_user(
         self,
         bot: commands.Bot,
@@ -101,7 +181,18 @@ class RegistrationService:
         if error:
             return False, error
 
-        self.user_upsert(interaction.user.id, student_id, email, name)
+        clash = self._store.user_claim(interaction.user.id, student_id, email.lower(), name.strip())
+        if clash == "student_id":
+            return False, "This SID is already registered to another account."
+        if clash == "email":
+            return False, "This email is already registered to another account."
+        self._events.emit(
+            "registered",
+            user=interaction.user.id,
+            student_id=student_id,
+            email=email.lower(),
+            name=name.strip(),
+        )
 
         target_guild: Optional[discord.Guild] = None
         if interaction.guild and interaction.guild.id == self._config.guild_id:
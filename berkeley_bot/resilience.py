@@ -0,0 +1,196 @@
+"""Retries and circuit breaking for Discord REST calls.
+
+``call(route, op)`` runs ``op`` and retries 503s, timeouts and connection
+errors with full-jitter exponential backoff. discord.py already retries 500,
+502, 504 and 524 itself, so those are not retried again here. Only idempotent
+operations are retried: a create that timed out may still have happened.
+Every route has a :class:`CircuitBreaker`. Each logical call that ends in a
+transient failure counts once, and after repeated failures the breaker opens
+and rejects calls at once with :class:`CircuitOpenError` until a cool-down
+has passed. While Discord is degraded, retries from the bot and from students
+then stop piling onto it.
+
+discord.py already honours 429s, so rate limits are not treated as failures
+here.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import aiohttp
+import discord
+
+from .tracing import span
+
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MAX_ATTEMPTS = 3
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+
+class CircuitOpenError(discord.DiscordException):
+    """Raised instead of calling Discord while a route's breaker is open."""
+
+    def __init__(self, route: str, retry_after: float):
+        super().__init__(f"{route} is temporarily unavailable; retry in {retry_after:.0f}s")
+        self.route = route
+        self.retry_after = retry_after
+
+
+# 5xx statuses discord.py's HTTP client has already retried before raising.
+LIBRARY_RETRIED = frozenset({500, 502, 504, 524})
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether ``exc`` says the route is unhealthy (counts toward the breaker)."""
+    if isinstance(exc, discord.HTTPException):
+        return exc.status >= 500
+    return isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientConnectionError))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transient failures that discord.py has not retried already."""
+    if isinstance(exc, discord.HTTPException):
+        return exc.status >= 500 and exc.status not in LIBRARY_RETRIED
+    return is_transient(exc)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full jitter: uniform in [0, min(MAX_DELAY, BASE_DELAY * 2**attempt)]."""
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Closed -> open after ``threshold`` consecutive transient failures -> half-open after ``reset_timeout``."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, route: str, *, threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.route = route
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.trips = 0
+        self.calls = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def before(self) -> None:
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probing):
+            raise CircuitOpenError(self.route, self.retry_after())
+        if state == self.HALF_OPEN:
+            # Let exactly one probe through; its outcome closes or re-opens.
+            self._probing = True
+        self.calls += 1
+
+    def success(self) -> None:
+        if self.opened_at is not None:
+            log.info("Circuit %s closed", self.route)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def abandon(self) -> None:
+        """The call ended without a verdict (e.g. cancelled); free the half-open probe slot."""
+        self._probing = False
+
+    def failure(self, exc: BaseException) -> None:
+        self._probing = False
+        if not is_transient(exc):
+            # 4xx means Discord answered; the route itself is healthy.
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                self.trips += 1
+                log.warning("Circuit %s opened after %d failures", self.route, self.failures)
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class BreakerStatus:
+    route: str
+    state: str
+    failures: int
+    trips: int
+    calls: int
+    retry_after: float
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def breaker(route: str) -> CircuitBreaker:
+    found = _breakers.get(route)
+    if found is None:
+        found = _breakers[route] = CircuitBreaker(route)
+    return found
+
+
+def breaker_statuses() -> List[BreakerStatus]:
+    return [
+        BreakerStatus(b.route, b.state, b.failures, b.trips, b.calls, b.retry_after())
+        for b in sorted(_breakers.values(), key=lambda b: b.route)
+    ]
+
+
+async def call(
+    route: str,
+    op: Callable[[], Awaitable[T]],
+    *,
+    idempotent: bool = True,
+    attempts: int = MAX_ATTEMPTS,
+) -> T:
+    """Run ``op()`` through ``route``'s breaker, retrying retryable failures if idempotent.
+
+    The breaker sees one outcome per call, however many attempts it took.
+    """
+    guard = breaker(route)
+    guard.before()
+    attempt = 0
+    while True:
+        try:
+            with span(f"discord:{route}", attempt=attempt + 1):
+                result = await op()
+        except (discord.HTTPException, asyncio.TimeoutError, aiohttp.ClientConnectionError) as exc:
+            attempt += 1
+            # Stop early if other calls have opened the breaker meanwhile.
+            if not idempotent or not is_retryable(exc) or attempt >= attempts or guard.state == guard.OPEN:
+                guard.failure(exc)
+                raise
+            delay = backoff_delay(attempt)
+            log.info("Retrying %s in %.2fs after %s", route, delay, exc)
+            await asyncio.sleep(delay)
+        except BaseException:
+            guard.abandon()
+            raise
+        else:
+            guard.success()
+            return result
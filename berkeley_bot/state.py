@@ -4,42 +4,53 @@ from __future__ import annotations
 
 import os
 import re
-from typing import Callable, List
+from typing import Callable, Dict, List, Optional
 
-from dotenv import load_dotenv
-
-from .config import PROJECT_ROOT
-
-
-# Ensure environment overrides (DEFAULT_TERM) are available even if load_config()
-# has not been called yet.
-load_dotenv(PROJECT_ROOT / ".env")
+# Importing config loads .env, so DEFAULT_TERM overrides are visible below even
+# if load_config() has not been called yet.
+from . import config  # noqa: F401
 
 
 TERM_PATTERN = re.compile(r"^(fa|sp)\d{2}$")
 
 _current_term = os.getenv("DEFAULT_TERM", "fa25").lower()
-_listeners: List[Callable[[str], None]] = []
+# Per-guild overrides; guilds without an entry fall back to ``_current_term``.
+_guild_terms: Dict[int, str] = {}
+_listeners: List[Callable[[str, Optional[int]], None]] = []
 
 
-def current_term() -> str:
+def current_term(guild_id: Optional[int] = None) -> str:
+    if guild_id is not None:
+        return _guild_terms.get(guild_id, _current_term)
     return _current_term
 
 
-def set_current_term(term: str) -> None:
-    global _current_term
+def init_guild_term(guild_id: int, term: str) -> None:
+    """Seed a guild's term from configuration without notifying listeners."""
+    _guild_terms.setdefault(guild_id, validate_term(term))
+
+
+def validate_term(term: str) -> str:
     t = term.strip().lower()
     if not TERM_PATTERN.match(t):
         raise ValueError("Term must match faYY or spYY, e.g. fa25")
-    _current_term = t
+    return t
+
+
+def set_current_term(term: str, guild_id: Optional[int] = None) -> None:
+    global _current_term
+    t = validate_term(term)
+    if guild_id is None:
+        _current_term = t
+    else:
+        _guild_terms[guild_id] = t
     for callback in list(_listeners):
         try:
-            callback(t)
+            callback(t, guild_id)
         except Exception:
             # Listeners should not break term updates.
             continue
 
 
-def on_term_change(callback: Callable[[str], None]) -> None:
+def on_term_change(callback: Callable[[str, Optional[int]], None]) -> None:
     _listeners.append(callback)
-
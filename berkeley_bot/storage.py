@@ -3,18 +3,114 @@
 from __future__ import annotations
 
 import json
+import os
 import pathlib
-from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+from .archive import ArchiveShelf
+from .binindex import BinaryCourseIndex, json_to_binary
+from .compact import (
+    CourseIndexTable,
+    EnrollmentTable,
+    RosterTable,
+    SlugTable,
+    UserRecord,
+    UserTable,
+    deep_sizeof,
+)
 from .config import PathConfig
+from .courses import CourseKey
+from .locking import FileLock, lock_path_for
+from .tracing import span
+
+
+class _Document:
+    """A JSON file mirrored in memory in its compact form.
+
+    The cached value is reused until the file's stat signature changes, which
+    also picks up writes made by other processes sharing the data directory.
+    """
+
+    __slots__ = ("path", "parse", "dump", "signature", "value")
+
+    def __init__(self, path: pathlib.Path, parse: Callable[[dict, SlugTable], Any], dump: Callable[[Any], dict]):
+        self.path = path
+        self.parse = parse
+        self.dump = dump
+        self.signature: Optional[Tuple[int, int, int]] = None
+        self.value: Any = None
 
 
 class DataStore:
-    def __init__(self, paths: PathConfig):
+    def __init__(self, paths: PathConfig, *, binary_index: bool = False):
         self._paths = paths
-        for path in (paths.course_index, paths.enrollments, paths.users):
+        self._locks: Dict[pathlib.Path, FileLock] = {}
+        self._slugs = SlugTable()
+        self._index = _Document(paths.course_index, CourseIndexTable.from_json, CourseIndexTable.to_json)
+        self._enrollments = _Document(paths.enrollments, EnrollmentTable.from_json, EnrollmentTable.to_json)
+        self._users = _Document(paths.users, lambda data, _: UserTable.from_json(data), UserTable.to_json)
+        self._roster = _Document(paths.roster, lambda data, _: RosterTable.from_json(data), RosterTable.to_json)
+        self._archives = ArchiveShelf(paths.archive_dir)
+        self._use_binary_index = binary_index
+        self._binary: Optional[BinaryCourseIndex] = None
+        # Files are touched on first use (or by warm()), not at construction,
+        # so building the bot does no disk I/O before login.
+        self._opened = False
+
+    def _open(self) -> None:
+        if self._opened:
+            return
+        paths = self._paths
+        for path in (paths.course_index, paths.enrollments, paths.users, paths.roster):
             if not path.exists():
-                path.write_text("{}", encoding="utf-8")
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with self._lock(path):
+                    if not path.exists():
+                        path.write_text("{}", encoding="utf-8")
+        if self._use_binary_index:
+            with self._lock(paths.course_index_bin):
+                if not paths.course_index_bin.exists():
+                    # First run with the binary format: carry over the JSON index.
+                    json_to_binary(paths.course_index, paths.course_index_bin)
+            self._binary = BinaryCourseIndex(paths.course_index_bin)
+        self._opened = True
+
+    def _warm_docs(self) -> List[_Document]:
+        docs = [self._enrollments, self._users, self._roster]
+        return docs if self._use_binary_index else [self._index, *docs]
+
+    def parse_fresh(self) -> Tuple[SlugTable, Dict[pathlib.Path, Tuple[Any, Any]]]:
+        """Parse every document into new tables, touching no state of this store.
+
+        Safe to run in a worker thread; hand the result to :meth:`install` on
+        the event loop.
+        """
+        slugs = SlugTable()
+        parsed: Dict[pathlib.Path, Tuple[Any, Any]] = {}
+        for doc in self._warm_docs():
+            signature = self._signature(doc.path)
+            parsed[doc.path] = (signature, doc.parse(self._load_json(doc.path), slugs))
+        return slugs, parsed
+
+    def install(self, slugs: SlugTable, parsed: Dict[pathlib.Path, Tuple[Any, Any]]) -> None:
+        """Adopt tables from :meth:`parse_fresh` for documents not loaded in the meantime."""
+        self._open()
+        shared = (self._index, self._enrollments)
+        # Index and enrollments share one slug table; swap it only if neither was loaded yet.
+        take_shared = all(doc.value is None for doc in shared)
+        if take_shared:
+            self._slugs = slugs
+        for doc in self._warm_docs():
+            if doc.value is None and (take_shared or doc not in shared) and doc.path in parsed:
+                doc.signature, doc.value = parsed[doc.path]
+
+    def _lock(self, path: pathlib.Path) -> FileLock:
+        lock = self._locks.get(path)
+        if lock is None:
+            lock = self._locks[path] = FileLock(lock_path_for(path))
+        return lock
 
     @staticmethod
     def _load_json(path: pathlib.Path) -> dict:
@@ -34,82 +130,332 @@ class DataStore:
             json.dump(data, fh, indent=2)
         tmp_path.replace(path)
 
+    @staticmethod
+    def _signature(path: pathlib.Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _current(self, doc: _Document) -> Any:
+        self._open()
+        signature = self._signature(doc.path)
+        if doc.value is None or signature != doc.signature:
+            with span("store.load", file=doc.path.name):
+                doc.value = doc.parse(self._load_json(doc.path), self._slugs)
+            doc.signature = signature
+        return doc.value
+
+    @contextmanager
+    def _transaction(self, doc: _Document) -> Iterator[Any]:
+        """Read-modify-write ``doc`` while holding its cross-process lock.
+
+        Readers never lock: ``_save_json`` swaps files atomically, so they see
+        either the old or the new document.
+        """
+        self._open()
+        with span("store.write", file=doc.path.name), self._lock(doc.path):
+            value = self._current(doc)
+            try:
+                yield value
+                self._save_json(doc.path, doc.dump(value))
+            except BaseException:
+                # The in-memory copy may be half-updated; reload it next time.
+                doc.value = None
+                raise
+            doc.signature = self._signature(doc.path)
+
     # -------------------- Course Index --------------------
-    def index_upsert(self, slug: str, container_id: int, thread_id: int) -> None:
-        data = self._load_json(self._paths.course_index)
-        data[slug] = {
-            "container_id": int(container_id),
-            "thread_id": int(thread_id),
-        }
-        self._save_json(self._paths.course_index, data)
+    def index_upsert(self, key: CourseKey, container_id: int, thread_id: int) -> None:
+        self._open()
+        self._check_writable(key)
+        if self._binary is not None:
+            with span("store.write", file=self._paths.course_index_bin.name), self._lock(self._paths.course_index_bin):
+                self._binary.put(key.slug, container_id, thread_id)
+            return
+        with self._transaction(self._index) as index:
+            index.put(key, container_id, thread_id)
 
-    def index_get(self, slug: str) -> Optional[Dict[str, int]]:
-        data = self._load_json(self._paths.course_index)
-        raw = data.get(slug)
+    def index_get(self, key: CourseKey) -> Optional[Dict[str, int]]:
+        self._open()
+        archive = self._archives.get(key.term) if self._archives.has(key.term) else None
+        if archive is not None:
+            raw = archive.index.get(key)
+        elif self._binary is not None:
+            raw = self._binary.get(key.slug)
+        else:
+            raw = self._current(self._index).get(key)
         if raw is None:
             return None
         return {
-            "container_id": int(raw["container_id"]),
-            "thread_id": int(raw["thread_id"]),
+            "container_id": raw[0],
+            "thread_id": raw[1],
         }
 
+    def container_thread_counts(self, term: str) -> "Counter[int]":
+        """Course threads placed in each container (by id) for ``term``."""
+        self._open()
+        term = term.lower()
+        if self._binary is not None:
+            entries = ((CourseKey.parse(slug), raw) for slug, raw in self._binary.items())
+        else:
+            index = self._current(self._index)
+            entries = ((index.slugs.key(sid), raw) for sid, raw in index.entries.items())
+        return Counter(raw[0] for key, raw in entries if key is not None and key.term == term)
+
     # -------------------- Enrollments --------------------
-    def add_enrollment(self, user_id: int, slug: str) -> None:
-        data = self._load_json(self._paths.enrollments)
-        entries = data.setdefault(str(user_id), [])
-        if slug not in entries:
-            entries.append(slug)
-        self._save_json(self._paths.enrollments, data)
-
-    def remove_enrollment(self, user_id: int, slug: str) -> None:
-        data = self._load_json(self._paths.enrollments)
-        entries = data.get(str(user_id), [])
-        if slug in entries:
-            entries.remove(slug)
-        if not entries and str(user_id) in data:
-            data.pop(str(user_id), None)
-        self._save_json(self._paths.enrollments, data)
-
-    def list_enrollments(self, user_id: int) -> List[str]:
-        data = self._load_json(self._paths.enrollments)
-        return list(data.get(str(user_id), []))
-
-    def list_enrollments_for_term(self, user_id: int, term: str) -> List[str]:
-        prefix = term.lower() + "-"
-        return [slug for slug in self.list_enrollments(user_id) if slug.lower().startswith(prefix)]
+    def add_enrollment(self, user_id: int, key: CourseKey) -> None:
+        self._check_writable(key)
+        with self._transaction(self._enrollments) as enrollments:
+            if enrollments.add(int(user_id), key):
+                self._save_json(self._paths.stats, enrollments.counters.to_json())
+
+    def add_enrollments(self, pairs: Iterable[Tuple[int, CourseKey]]) -> List[Tuple[int, CourseKey]]:
+        """Record many enrollments in one write; returns the pairs that were new."""
+        pairs = list(pairs)
+        for _, key in pairs:
+            self._check_writable(key)
+        with self._transaction(self._enrollments) as enrollments:
+            added = [(user_id, key) for user_id, key in pairs if enrollments.add(int(user_id), key)]
+            if added:
+                self._save_json(self._paths.stats, enrollments.counters.to_json())
+            return added
+
+    def remove_enrollment(self, user_id: int, key: CourseKey) -> bool:
+        """Forget one enrollment; returns False if the user didn't hold it."""
+        with self._transaction(self._enrollments) as enrollments:
+            removed = enrollments.remove(int(user_id), key)
+            if removed:
+                self._save_json(self._paths.stats, enrollments.counters.to_json())
+            return removed
+
+    def list_enrollments(self, user_id: int) -> List[CourseKey]:
+        """Courses in the hot (unarchived) terms."""
+        return self._current(self._enrollments).list(int(user_id))
+
+    def iter_enrollments(self, term: Optional[str] = None) -> Iterator[Tuple[int, List[CourseKey]]]:
+        """Yield ``(user_id, courses)`` for every enrolled user, one user at a time.
+
+        With ``term`` only that term is read, from its archive if it has one;
+        without, the hot terms are followed by each archive in turn.
+        """
+        if term is not None:
+            sources = [self._enrollments_for(term)]
+        else:
+            sources = [self._current(self._enrollments)]
+            sources += (self._archives.get(t).enrollments for t in self._archives.terms())
+        for enrollments in sources:
+            # Snapshot only the ids so callers may await between items while
+            # enrollments keep changing underneath.
+            for uid in list(enrollments.by_user):
+                keys = enrollments.list_term(uid, term) if term else enrollments.list(uid)
+                if keys:
+                    yield uid, keys
+
+    def list_enrollments_for_term(self, user_id: int, term: str) -> List[CourseKey]:
+        return self._enrollments_for(term).list_term(int(user_id), term)
 
     def courses_by_term_and_dept(
         self, user_id: int, term: str, dept_slug: str
-    ) -> List[str]:
-        matches = []
-        for slug in self.list_enrollments(user_id):
-            if slug.lower().startswith(term.lower()) and f"-{dept_slug.lower()}-" in slug.lower():
-                matches.append(slug)
-        return matches
+    ) -> List[CourseKey]:
+        return self._enrollments_for(term).list_term_dept(int(user_id), term, dept_slug)
+
+    def dept_totals_for_term(self, user_id: int, term: str) -> Dict[str, int]:
+        """Number of courses the user holds per department in ``term``."""
+        return self._enrollments_for(term).dept_totals(int(user_id), term)
+
+    # -------------------- Counters --------------------
+    # Maintained on every add/remove and mirrored to ``enrollment_stats.json``
+    # so dashboards never need to scan per-user lists.
+    def course_counts(self, term: str) -> Dict[CourseKey, int]:
+        return self._enrollments_for(term).counters.course_counts(term)
+
+    def top_courses(self, term: str, n: int = 10) -> List[Tuple[CourseKey, int]]:
+        return self._enrollments_for(term).counters.top_courses(term, n)
+
+    def dept_counts(self, term: str) -> Dict[str, int]:
+        return self._enrollments_for(term).counters.dept_counts(term)
+
+    # -------------------- Term archives --------------------
+    # Only hot terms live in enrollments.json / the course index. Past terms
+    # are moved to read-only archives by rollover() and parsed on demand.
+    def _enrollments_for(self, term: str) -> EnrollmentTable:
+        term = term.lower()
+        if self._archives.has(term):
+            archive = self._archives.get(term)
+            if archive is not None:
+                return archive.enrollments
+        return self._current(self._enrollments)
+
+    def _check_writable(self, key: CourseKey) -> None:
+        if self._archives.has(key.term):
+            raise ValueError(f"Term {key.term} is archived and read-only.")
+
+    def is_archived(self, term: str) -> bool:
+        return self._archives.has(term)
+
+    def archived_terms(self) -> List[str]:
+        return list(self._archives.terms())
+
+    def rollover(self, current: str) -> List[str]:
+        """Archive every hot term except ``current`` and restore ``current`` if archived.
+
+        Returns the terms that were archived. Archives are written before
+        the hot files shrink, so a crash mid-way at worst leaves a term in both
+        places, and the next rollover merges it.
+        """
+        self._open()
+        current = current.lower()
+        index_lock = self._paths.course_index_bin if self._binary is not None else self._paths.course_index
+        archived: List[str] = []
+        with self._lock(self._paths.enrollments), self._lock(index_lock):
+            hot_terms = self._current(self._enrollments).terms() | self._index_terms()
+            for term in sorted(hot_terms - {current}):
+                self._archive_term(term)
+                archived.append(term)
+            if self._archives.has(current):
+                self._restore_term(current)
+        return archived
+
+    def _index_terms(self) -> Set[str]:
+        if self._binary is not None:
+            keys = (CourseKey.parse(slug) for slug, _ in self._binary.items())
+            return {key.term for key in keys if key is not None}
+        return self._current(self._index).terms()
+
+    def _archive_term(self, term: str) -> None:
+        enrollments = self._current(self._enrollments)
+        snapshot = {str(uid): [key.slug for key in enrollments.list_term(uid, term)] for uid in enrollments.by_user}
+        snapshot = {uid: slugs for uid, slugs in snapshot.items() if slugs}
+        if self._binary is not None:
+            index_part = {
+                slug: {"container_id": c, "thread_id": t}
+                for slug, (c, t) in self._binary.items()
+                if slug.startswith(term + "-")
+            }
+        else:
+            index_part = {
+                slug: raw
+                for slug, raw in self._current(self._index).to_json().items()
+                if slug.startswith(term + "-")
+            }
+        self._archives.write(term, snapshot, index_part)
+
+        with self._transaction(self._enrollments) as table:
+            table.extract_term(term)
+            self._save_json(self._paths.stats, table.counters.to_json())
+        if self._binary is not None:
+            self._binary.remove(index_part)
+        else:
+            with self._transaction(self._index) as index:
+                index.extract_term(term)
+
+    def _restore_term(self, term: str) -> None:
+        data = self._archives.read(term)
+        with self._transaction(self._enrollments) as table:
+            for uid, slugs in data.get("enrollments", {}).items():
+                for key in filter(None, map(CourseKey.parse, slugs)):
+                    table.add(int(uid), key)
+            self._save_json(self._paths.stats, table.counters.to_json())
+        entries = [
+            (key, raw["container_id"], raw["thread_id"])
+            for key, raw in ((CourseKey.parse(slug), raw) for slug, raw in data.get("course_index", {}).items())
+            if key is not None
+        ]
+        if self._binary is not None:
+            for key, container_id, thread_id in entries:
+                self._binary.put(key.slug, container_id, thread_id)
+        else:
+            with self._transaction(self._index) as index:
+                for key, container_id, thread_id in entries:
+                    index.put(key, container_id, thread_id)
+        self._archives.remove(term)
+
+    # -------------------- Current term --------------------
+    def saved_term(self) -> Optional[str]:
+        """Term last set with ``/set_term``, or None if it was never set."""
+        return self._load_json(self._paths.term).get("term")
+
+    def save_term(self, term: str) -> None:
+        self._save_json(self._paths.term, {"term": term})
 
     # -------------------- Users --------------------
     def user_get(self, uid: int) -> Optional[Dict[str, str]]:
-        data = self._load_json(self._paths.users)
-        raw = data.get(str(uid))
-        return dict(raw) if raw else None
+        record = self._current(self._users).records.get(int(uid))
+        return record.to_dict() if record else None
 
     def user_upsert(self, uid: int, sid: str, email: str, name: str) -> None:
-        data = self._load_json(self._paths.users)
-        data[str(uid)] = {
-            "student_id": sid,
-            "email": email,
-            "name": name,
-        }
-        self._save_json(self._paths.users, data)
+        with self._transaction(self._users) as users:
+            users.put(int(uid), UserRecord(sid, email, name))
+
+    def user_claim(self, uid: int, sid: str, email: str, name: str) -> Optional[str]:
+        """Upsert unless another account holds ``sid`` or ``email``.
+
+        Returns the clashing field (``"student_id"`` or ``"email"``) instead of
+        writing. The check and the write share one lock, so two processes
+        cannot both claim the same SID.
+        """
+        self._open()
+        with self._lock(self._paths.users):
+            clash = self._current(self._users).conflict(int(uid), sid, email)
+            if clash is None:
+                self.user_upsert(uid, sid, email, name)
+            return clash
+
+    def user_ids(self) -> List[int]:
+        return list(self._current(self._users).records)
+
+    def user_by_sid(self, sid: str) -> Optional[int]:
+        return self._current(self._users).by_sid.get(sid)
+
+    def user_by_email(self, email: str) -> Optional[int]:
+        return self._current(self._users).by_email.get(email.lower())
 
     def user_delete(self, uid: int) -> None:
-        data = self._load_json(self._paths.users)
-        data.pop(str(uid), None)
-        self._save_json(self._paths.users, data)
+        with self._transaction(self._users) as users:
+            users.pop(int(uid))
+
+    # -------------------- Roster --------------------
+    def roster_size(self) -> int:
+        return len(self._current(self._roster).students)
+
+    def roster_email(self, sid: str) -> Optional[str]:
+        """Roster email for ``sid`` ("" if none was listed), or None if absent."""
+        return self._current(self._roster).students.get(sid)
+
+    def roster_import(self, students: Dict[str, str], *, replace: bool = True) -> int:
+        with self._transaction(self._roster) as roster:
+            # Build the new roster aside and swap it in, so a concurrent
+            # registration never sees it empty or half-filled.
+            merged = {} if replace else dict(roster.students)
+            merged.update((sid, email.lower()) for sid, email in students.items())
+            roster.students = merged
+            return len(merged)
+
+    # -------------------- Diagnostics --------------------
+    def memory_report(self) -> Dict[str, int]:
+        """Compare the compact in-memory tables with plain ``json.load`` output."""
+        self._open()
+        index = self._current(self._index) if self._binary is None else None
+        enrollments = self._current(self._enrollments)
+        users = self._current(self._users)
+        compact = deep_sizeof(index, enrollments, users)
+        as_json = deep_sizeof(*(self._load_json(path) for path in (
+            self._paths.course_index, self._paths.enrollments, self._paths.users,
+        )))
+        return {
+            "users": len(users.records),
+            "enrolled_users": len(enrollments.by_user),
+            "enrollments": enrollments.total(),
+            "slugs": len(self._slugs),
+            "compact_bytes": compact,
+            "json_bytes": as_json,
+        }
 
 
-def indexed_course_and_thread(store: DataStore, slug: str) -> Optional[Tuple[int, int]]:
-    meta = store.index_get(slug)
+def indexed_course_and_thread(store: DataStore, key: CourseKey) -> Optional[Tuple[int, int]]:
+    meta = store.index_get(key)
     if not meta:
         return None
     return int(meta["container_id"]), int(meta["thread_id"])
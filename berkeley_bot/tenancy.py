@@ -0,0 +1,114 @@
+"""Per-guild service wiring for multi-server deployments."""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+import discord
+from discord.ext import commands
+
+from . import state
+from .config import BotConfig, GuildConfig
+from .enrollment import EnrollmentService
+from .events import EventLog
+from .registration import RegistrationService
+from .storage import DataStore
+
+
+@dataclass
+class GuildContext:
+    """Everything one guild needs: its config, its store and its services."""
+
+    config: GuildConfig
+    store: DataStore
+    registration: RegistrationService
+    enrollment: EnrollmentService
+    events: EventLog
+
+    @property
+    def guild_id(self) -> int:
+        return self.config.guild_id
+
+    def current_term(self) -> str:
+        return state.current_term(self.guild_id)
+
+    def resolve_guild(
+        self, bot: commands.Bot, interaction: Optional[discord.Interaction] = None
+    ) -> Optional[discord.Guild]:
+        if interaction is not None and interaction.guild and interaction.guild.id == self.guild_id:
+            return interaction.guild
+        return bot.get_guild(self.guild_id)
+
+
+def build_context(config: GuildConfig) -> GuildContext:
+    store = DataStore(config.paths, binary_index=config.binary_index)
+    # A term set with /set_term wins over DEFAULT_TERM, which may since have been archived.
+    state.init_guild_term(config.guild_id, store.saved_term() or config.default_term)
+    events = EventLog(config.paths.events_dir, guild_id=config.guild_id)
+    return GuildContext(
+        config=config,
+        store=store,
+        registration=RegistrationService(store, config, events=events),
+        enrollment=EnrollmentService(
+            store,
+            events=events,
+            guild_id=config.guild_id,
+            private_containers=config.private_containers,
+            active_thread_limit=config.active_thread_limit,
+            container_max_threads=config.container_max_threads,
+            container_max_overwrites=config.container_max_overwrites,
+        ),
+        events=events,
+    )
+
+
+class TenantRegistry:
+    """Routes interactions to the :class:`GuildContext` of their guild."""
+
+    def __init__(self, config: BotConfig):
+        self._primary_id = config.guild_id
+        self._contexts: Dict[int, GuildContext] = {
+            gid: build_context(guild_config) for gid, guild_config in config.guilds.items()
+        }
+
+    def __iter__(self) -> Iterator[GuildContext]:
+        return iter(self._contexts.values())
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    @property
+    def primary(self) -> GuildContext:
+        return self._contexts[self._primary_id]
+
+    def get(self, guild_id: Optional[int]) -> Optional[GuildContext]:
+        if guild_id is None:
+            return None
+        return self._contexts.get(guild_id)
+
+    async def warm_up(self) -> None:
+        """Parse every guild's store off the event loop, in parallel, then install the tables on it.
+
+        The worker threads build fresh tables only; interactions already being
+        handled on the loop never see a store mutated from another thread.
+        """
+        contexts = list(self)
+        results = await asyncio.gather(*(asyncio.to_thread(ctx.store.parse_fresh) for ctx in contexts))
+        for ctx, (slugs, parsed) in zip(contexts, results):
+            ctx.store.install(slugs, parsed)
+
+    def guild_objects(self) -> List[discord.Object]:
+        return [discord.Object(id=gid) for gid in self._contexts]
+
+    def resolve(self, interaction: discord.Interaction) -> GuildContext:
+        """Context for the interaction's guild; DMs use the user's first shared guild."""
+        ctx = self.get(interaction.guild_id)
+        if ctx is not None:
+            return ctx
+        for guild in getattr(interaction.user, "mutual_guilds", []):
+            ctx = self.get(guild.id)
+            if ctx is not None:
+                return ctx
+        return self.primary
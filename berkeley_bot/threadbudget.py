@@ -0,0 +1,114 @@
+"""Keeps the guild under Discord's active-thread cap.
+
+Discord allows a limited number of active threads per guild, and once it is
+reached ``create_thread`` and unarchiving both fail. :class:`ThreadBudget`
+watches the active count from the gateway cache. Once the count passes the
+high-water mark, it archives the least recently used course threads down to
+the low-water mark. Archived course threads are revived by id when an enroll
+or drop needs them (see :func:`channels.revive_thread`), so students never
+notice.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional, Set
+
+import discord
+
+from .courses import COURSE_CATEGORY_PREFIX
+from .resilience import CircuitOpenError, call
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 1000
+# Start archiving at 90% of the cap and stop once usage is back to 80%.
+HIGH_WATER = 0.9
+LOW_WATER = 0.8
+
+
+def is_course_thread(thread: discord.Thread) -> bool:
+    category = getattr(thread.parent, "category", None)
+    return category is not None and category.name.startswith(COURSE_CATEGORY_PREFIX)
+
+
+class ThreadBudget:
+    """Per-guild active-thread accounting with LRU auto-archive."""
+
+    def __init__(self, limit: int = DEFAULT_LIMIT, *, on_archive: Callable[[discord.Thread], None] = lambda t: None):
+        self.limit = limit
+        self._on_archive = on_archive
+        self.archived = 0
+        # thread id -> wall-clock time of the last enroll, drop or message seen.
+        self._touched: Dict[int, float] = {}
+        # Archived by us but possibly still active in the cache until THREAD_UPDATE arrives.
+        self._pending: Set[int] = set()
+        self._trim: Optional[asyncio.Task] = None
+
+    @property
+    def high_water(self) -> int:
+        return int(self.limit * HIGH_WATER)
+
+    @property
+    def low_water(self) -> int:
+        return int(self.limit * LOW_WATER)
+
+    def touch(self, thread_id: int) -> None:
+        self._touched[thread_id] = time.time()
+        self._pending.discard(thread_id)
+
+    def active_count(self, guild: discord.Guild) -> int:
+        return sum(1 for t in guild.threads if not t.archived and t.id not in self._pending)
+
+    def last_active(self, thread: discord.Thread) -> float:
+        # Threads we haven't touched since startup fall back to their last message (or creation).
+        seen = discord.utils.snowflake_time(thread.last_message_id or thread.id).timestamp()
+        return max(seen, self._touched.get(thread.id, 0.0))
+
+    async def make_room(self, guild: discord.Guild, *, keep: Optional[int] = None) -> None:
+        """Ensure one more thread can become active.
+
+        Past the high-water mark a background trim starts. Only a guild that
+        is actually at the cap waits for the trim to finish.
+        """
+        active = self.active_count(guild)
+        if active < self.high_water:
+            return
+        if self._trim is None or self._trim.done():
+            self._trim = asyncio.create_task(self._trim_to(guild, self.low_water, keep))
+        if active >= self.limit - 1:
+            await asyncio.shield(self._trim)
+
+    async def _trim_to(self, guild: discord.Guild, target: int, keep: Optional[int]) -> None:
+        candidates = sorted(
+            (
+                t for t in guild.threads
+                if not t.archived and t.id != keep and t.id not in self._pending and is_course_thread(t)
+            ),
+            key=self.last_active,
+        )
+        excess = self.active_count(guild) - target
+        archived = 0
+        for thread in candidates:
+            if archived >= excess:
+                break
+            try:
+                await call("threads.edit", lambda t=thread: t.edit(archived=True))
+            except (discord.Forbidden, discord.NotFound, CircuitOpenError):
+                continue
+            except discord.HTTPException:
+                log.warning("Could not archive thread %s", thread.id, exc_info=True)
+                continue
+            self._pending.add(thread.id)
+            self._touched.pop(thread.id, None)
+            self._on_archive(thread)
+            archived += 1
+        self.archived += archived
+        if archived:
+            log.info("Archived %d idle course threads in %s (%d active)", archived, guild.id, self.active_count(guild))
+        # Anything the gateway already reports as archived no longer needs tracking.
+        live = {t.id for t in guild.threads if not t.archived}
+        self._pending &= live
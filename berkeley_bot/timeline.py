@@ -0,0 +1,46 @@
+"""Opt-in cold-start timeline (``STARTUP_TIMELINE=1``)."""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import List, Tuple
+
+
+log = logging.getLogger(__name__)
+
+
+class StartupTimeline:
+    """Records named milestones relative to when the package was first imported."""
+
+    def __init__(self) -> None:
+        self._origin = time.perf_counter()
+        self._marks: List[Tuple[str, float]] = []
+        self._reported = False
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv("STARTUP_TIMELINE", "").lower() in {"1", "true", "yes", "on"}
+
+    def mark(self, name: str) -> None:
+        self._marks.append((name, time.perf_counter()))
+
+    def report(self) -> str:
+        parts = []
+        previous = self._origin
+        for name, at in self._marks:
+            parts.append(f"{name} +{(at - previous) * 1000:.0f}ms")
+            previous = at
+        total = (previous - self._origin) * 1000
+        return f"{' | '.join(parts)} | total {total:.0f}ms"
+
+    def log_once(self) -> None:
+        """Log the timeline on the first ready only; reconnects don't count."""
+        if self._reported or not self.enabled:
+            return
+        self._reported = True
+        log.info("⏱️ Startup: %s", self.report())
+
+
+TIMELINE = StartupTimeline()
@@ -0,0 +1,228 @@
+"""Lightweight per-interaction tracing exported as NDJSON.
+
+Every interaction opens a root span with a fresh trace id. Nested
+:func:`span` blocks, such as service methods, Discord REST calls and storage
+reads/writes, attach to the active span through a ``ContextVar``, so they
+follow the interaction across ``await`` and into tasks it spawns.
+
+Sampling is controlled by environment variables:
+
+``TRACE_SAMPLE_RATE``
+    Fraction of interactions recorded in full (0-1, default 0).
+``TRACE_SLOW_MS``
+    Also keep any trace whose root took at least this long (default 0 = off).
+``TRACE_FILE``
+    Output path (default ``traces.ndjson`` in the project root).
+
+With both controls at 0, tracing is off and :func:`span` costs one
+``ContextVar`` lookup. Summarise the file with ``python trace_summary.py``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import json
+import logging
+import os
+import pathlib
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from .config import PROJECT_ROOT
+
+
+log = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+_NULL = contextlib.nullcontext()
+# Roots whose interaction never reported completion are dropped past this many.
+MAX_OPEN_ROOTS = 1000
+
+
+class _Trace:
+    __slots__ = ("trace_id", "root", "sampled", "spans")
+
+    def __init__(self, root: str, sampled: bool):
+        self.trace_id = os.urandom(8).hex()
+        self.root = root
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "wall", "start", "duration_ms", "error")
+
+    def __init__(self, trace: _Trace, name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.attrs = attrs
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        if error is not None:
+            self.error = type(error).__name__
+        self.trace.spans.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "root": self.trace.root,
+            "name": self.name,
+            "start": round(self.wall, 6),
+            "duration_ms": round(self.duration_ms or 0.0, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class _ActiveSpan:
+    __slots__ = ("_span", "_token")
+
+    def __init__(self, span: Span):
+        self._span = span
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self._token)
+        self._span.end(exc)
+
+
+class Tracer:
+    def __init__(self, path: pathlib.Path, *, sample_rate: float = 0.0, slow_ms: float = 0.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self._roots: Dict[int, Span] = {}
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(
+            pathlib.Path(os.getenv("TRACE_FILE", str(PROJECT_ROOT / "traces.ndjson"))),
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0") or 0),
+            slow_ms=float(os.getenv("TRACE_SLOW_MS", "0") or 0),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    # ------------ roots ------------
+    def start_root(self, name: str, **attrs: Any) -> Optional[Span]:
+        """Open a root span and make it current for the rest of this task."""
+        if not self.enabled:
+            return None
+        sampled = random.random() < self.sample_rate
+        root = Span(_Trace(name, sampled), name, None, attrs)
+        _current.set(root)
+        return root
+
+    def finish_root(self, root: Optional[Span], error: Optional[BaseException] = None) -> None:
+        if root is None or root.duration_ms is not None:
+            return
+        root.end(error)
+        trace = root.trace
+        if trace.sampled or (self.slow_ms and root.duration_ms >= self.slow_ms):
+            self._export(trace)
+
+    def begin_interaction(self, interaction_id: int, name: str, **attrs: Any) -> None:
+        root = self.start_root(name, **attrs)
+        if root is None:
+            return
+        self._roots[interaction_id] = root
+        while len(self._roots) > MAX_OPEN_ROOTS:
+            self._roots.pop(next(iter(self._roots)))
+
+    def end_interaction(self, interaction_id: int, error: Optional[BaseException] = None) -> None:
+        self.finish_root(self._roots.pop(interaction_id, None), error)
+
+    @contextlib.contextmanager
+    def root(self, name: str, **attrs: Any):
+        root = self.start_root(name, **attrs)
+        token = _current.set(root)
+        try:
+            yield root
+        except BaseException as exc:
+            self.finish_root(root, exc)
+            raise
+        else:
+            self.finish_root(root)
+        finally:
+            _current.reset(token)
+
+    # ------------ spans ------------
+    def span(self, name: str, **attrs: Any):
+        parent = _current.get()
+        if parent is None:
+            return _NULL
+        return _ActiveSpan(Span(parent.trace, name, parent, attrs))
+
+    # ------------ export ------------
+    def _export(self, trace: _Trace) -> None:
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False) + "\n" for span in trace.spans)
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+            self._writer.start()
+        # File I/O happens on the writer thread, never on the event loop.
+        self._queue.put(lines)
+
+    def _write_loop(self) -> None:
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            try:
+                with self.path.open("a", encoding="utf-8") as fh:
+                    fh.write(chunk)
+            except OSError:
+                log.warning("Could not write traces to %s", self.path, exc_info=True)
+
+
+TRACER = Tracer.from_env()
+
+
+def span(name: str, **attrs: Any):
+    """Child span of the current trace; a no-op outside a sampled interaction."""
+    return TRACER.span(name, **attrs)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator form of :func:`span` for sync and async functions."""
+
+    def decorate(fn: F) -> F:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with TRACER.span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with TRACER.span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
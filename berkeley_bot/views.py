@@ -1,382 +1,416 @@
-"""Discord UI components for enrollment and registration."""
+"""Discord UI components for enrollment and registration.
+
+Components are stateless: everything a click needs (owner, bucket, dept) is
+encoded in its ``custom_id`` under the ``bb:`` prefix, and one
+:class:`ComponentRouter` registered at startup handles them all. No View or
+Modal object outlives the message that sends it, so panels keep working
+across restarts and idle menus cost nothing.
+
+============================  ==========================================
+custom_id                     component
+============================  ==========================================
+``bb:verify``                 verify panel button -> registration modal
+``bb:register``               registration modal
+``bb:enroll``                 enroll panel button -> bucket select
+``bb:drop``                   enroll panel button -> drop select
+``bb:bucket:<uid>``           department range select
+``bb:dept:<uid>:<bucket>``    department select -> course numbers modal
+``bb:numbers:<uid>:<DEPT>``   course numbers modal
+``bb:dropsel:<uid>``          multi-select of courses to drop
+============================  ==========================================
+"""
 
 from __future__ import annotations
 
+import logging
 import re
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, Iterator, List
 
 import discord
 from discord import ui
 from discord.ext import commands
 
-from . import courses, state
-from .enrollment import EnrollmentService
-from .registration import RegistrationService
-from .storage import DataStore
+from . import courses
+from .admission import AdmissionController, AdmissionDenied, queue_notice
+from .bulk import ProgressReporter
+from .courses import CourseKey
+from .tenancy import GuildContext, TenantRegistry
+from .tracing import TRACER
 
 
+PREFIX = "bb:"
+
 BUCKETS = {
     "A–G": [d for d in courses.VALID_DEPTS if d[0] <= "G"],
     "H–N": [d for d in courses.VALID_DEPTS if "H" <= d[0] <= "N"],
     "O–Z": [d for d in courses.VALID_DEPTS if "O" <= d[0] <= "Z"],
 }
-
-
-class VerifyRegisterModal(ui.Modal):
-    def __init__(self, bot: commands.Bot, registration: RegistrationService):
-        super().__init__(title="Berkeley Student Registration")
-        self._bot = bot
-        self._registration = registration
-        self.sid = ui.TextInput(
-            label="Student ID (10 digits)",
-            placeholder="e.g., 3030XXXXXX",
-            max_length=10,
-            required=True,
-        )
-        self.email = ui.TextInput(
-            label="Berkeley Email",
-            placeholder="yourname@berkeley.edu",
-            max_length=80,
-            required=True,
-        )
-        self.name = ui.TextInput(
-            label="Full Name",
-            placeholder="Your real name",
-            max_length=50,
-            required=True,
-        )
-        self.add_item(self.sid)
-        self.add_item(self.email)
-        self.add_item(self.name)
-
-    async def on_submit(self, interaction: discord.Interaction) -> None:
-        ok, message = await self._registration.register_user(
-            self._bot,
-            interaction,
-            str(self.sid.value),
-            str(self.email.value),
-            str(self.name.value),
-        )
-        prefix = "✅ " if ok else "❌ "
-        await interaction.response.send_message(prefix + message, ephemeral=True)
-
-
-class VerifyPanelView(ui.View):
-    def __init__(self, bot: commands.Bot, registration: RegistrationService):
-        super().__init__(timeout=None)
-        self._bot = bot
-        self._registration = registration
-
-    @ui.button(label="Start Registration", style=discord.ButtonStyle.success)
-    async def start_registration(
-        self, interaction: discord.Interaction, button: ui.Button
-    ) -> None:
-        await interaction.response.send_modal(VerifyRegisterModal(self._bot, self._registration))
-
-
-class EnrollPanelView(ui.View):
-    def __init__(
-        self,
-        bot: commands.Bot,
-        registration: RegistrationService,
-        enrollment: EnrollmentService,
-        store: DataStore,
-    ):
-        super().__init__(timeout=None)
+BUCKET_NAMES = list(BUCKETS)
+
+log = logging.getLogger(__name__)
+
+# Minimum gap between edits of a streamed result message.
+STREAM_EDIT_INTERVAL = 1.0
+
+
+# -------------------- Component builders --------------------
+# Each builder is stopped before it is returned: discord.py only keeps
+# unfinished views/modals in its ViewStore, so stopped ones are sent and then
+# dropped, leaving dispatch entirely to the router.
+
+def _detached(view: ui.View) -> ui.View:
+    view.stop()
+    return view
+
+
+def verify_panel_view() -> ui.View:
+    view = ui.View(timeout=None)
+    view.add_item(ui.Button(label="Start Registration", style=discord.ButtonStyle.success, custom_id=f"{PREFIX}verify"))
+    return _detached(view)
+
+
+def enroll_panel_view() -> ui.View:
+    view = ui.View(timeout=None)
+    view.add_item(ui.Button(label="Enroll courses", style=discord.ButtonStyle.primary, custom_id=f"{PREFIX}enroll"))
+    view.add_item(ui.Button(label="Drop courses", style=discord.ButtonStyle.danger, custom_id=f"{PREFIX}drop"))
+    return _detached(view)
+
+
+def bucket_select_view(user_id: int) -> ui.View:
+    options = [discord.SelectOption(label=bucket, value=str(i)) for i, bucket in enumerate(BUCKET_NAMES)]
+    view = ui.View(timeout=None)
+    view.add_item(ui.Select(
+        custom_id=f"{PREFIX}bucket:{user_id}",
+        placeholder="Choose range (A–G / H–N / O–Z)",
+        min_values=1,
+        max_values=1,
+        options=options,
+    ))
+    return _detached(view)
+
+
+def dept_select_view(user_id: int, bucket: int) -> ui.View:
+    options = [discord.SelectOption(label=dept, value=dept) for dept in BUCKETS[BUCKET_NAMES[bucket]][:25]]
+    view = ui.View(timeout=None)
+    view.add_item(ui.Select(
+        custom_id=f"{PREFIX}dept:{user_id}:{bucket}",
+        placeholder="Select department",
+        min_values=1,
+        max_values=1,
+        options=options,
+    ))
+    return _detached(view)
+
+
+def drop_select_view(user_id: int, keys: List[CourseKey]) -> ui.View:
+    options = [discord.SelectOption(label=key.slug, value=key.slug) for key in keys[:25]]
+    view = ui.View(timeout=None)
+    view.add_item(ui.Select(
+        custom_id=f"{PREFIX}dropsel:{user_id}",
+        placeholder="Pick one or more courses to drop",
+        min_values=1,
+        max_values=min(25, len(options)),
+        options=options,
+    ))
+    return _detached(view)
+
+
+def register_modal() -> ui.Modal:
+    modal = ui.Modal(title="Berkeley Student Registration", timeout=None, custom_id=f"{PREFIX}register")
+    modal.add_item(ui.TextInput(
+        label="Student ID (10 digits)",
+        placeholder="e.g., 3030XXXXXX",
+        max_length=10,
+        required=True,
+        custom_id="sid",
+    ))
+    modal.add_item(ui.TextInput(
+        label="Berkeley Email",
+        placeholder="yourname@berkeley.edu",
+        max_length=80,
+        required=True,
+        custom_id="email",
+    ))
+    modal.add_item(ui.TextInput(
+        label="Full Name",
+        placeholder="Your real name",
+        max_length=50,
+        required=True,
+        custom_id="name",
+    ))
+    modal.stop()
+    return modal
+
+
+def numbers_modal(user_id: int, dept_up: str) -> ui.Modal:
+    modal = ui.Modal(title="Enroll multiple courses", timeout=None, custom_id=f"{PREFIX}numbers:{user_id}:{dept_up}")
+    modal.add_item(ui.TextInput(
+        label="Course numbers (comma-separated)",
+        placeholder="e.g., 7B, 105, 126",
+        style=discord.TextStyle.short,
+        max_length=200,
+        required=True,
+        custom_id="numbers",
+    ))
+    modal.stop()
+    return modal
+
+
+# -------------------- Dispatcher --------------------
+
+def _modal_values(components: List[Dict[str, Any]]) -> Dict[str, str]:
+    values: Dict[str, str] = {}
+    for item in _walk(components):
+        if "custom_id" in item and "value" in item:
+            values[item["custom_id"]] = str(item["value"])
+    return values
+
+
+def _bucket_index(raw: str) -> int:
+    bucket = int(raw)
+    if not 0 <= bucket < len(BUCKET_NAMES):
+        raise IndexError(bucket)
+    return bucket
+
+
+def _walk(components: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for item in components:
+        yield item
+        yield from _walk(item.get("components", ()))
+        if "component" in item:
+            yield from _walk([item["component"]])
+
+
+Handler = Callable[..., Awaitable[None]]
+
+# Number of ``:``-separated custom_id arguments each action carries.
+ARITY = {"verify": 0, "register": 0, "enroll": 0, "drop": 0, "bucket": 1, "dept": 2, "numbers": 2, "dropsel": 1}
+
+
+class ComponentRouter:
+    """Single ``on_interaction`` listener for every ``bb:`` component and modal."""
+
+    def __init__(self, bot: commands.Bot, tenants: TenantRegistry, admission: AdmissionController):
         self._bot = bot
-        self._registration = registration
-        self._enrollment = enrollment
-        self._store = store
-
-    @ui.button(label="Enroll courses", style=discord.ButtonStyle.primary)
-    async def enroll_courses(self, interaction: discord.Interaction, button: ui.Button) -> None:
-        if not interaction.guild:
-            await interaction.response.send_message("Use this command inside the server.", ephemeral=True)
+        self._tenants = tenants
+        self._admission = admission
+        self._handlers: Dict[str, Handler] = {
+            "verify": self._verify,
+            "register": self._register,
+            "enroll": self._enroll,
+            "drop": self._drop,
+            "bucket": self._bucket,
+            "dept": self._dept,
+            "numbers": self._numbers,
+            "dropsel": self._dropsel,
+        }
+
+    def install(self) -> None:
+        self._bot.add_listener(self.dispatch, "on_interaction")
+
+    async def dispatch(self, interaction: discord.Interaction) -> None:
+        if interaction.type not in (discord.InteractionType.component, discord.InteractionType.modal_submit):
             return
+        custom_id = (interaction.data or {}).get("custom_id", "")
+        if not custom_id.startswith(PREFIX):
+            return
+        action, *args = custom_id[len(PREFIX):].split(":")
+        handler = self._handlers.get(action)
+        if handler is None:
+            log.warning("Unknown component %s", custom_id)
+            return
+        try:
+            parsed = self._parse(action, args, interaction.data or {})
+        except (TypeError, ValueError, IndexError, KeyError):
+            # Malformed or outdated custom_id; errors from the handler itself propagate.
+            log.warning("Bad component payload %s", custom_id, exc_info=True)
+            await self._reply(interaction, "This menu has expired. Please start again.")
+            return
+        ctx = self._tenants.resolve(interaction)
+        with TRACER.root(f"component:{action}", guild=interaction.guild_id, user=interaction.user.id):
+            await handler(interaction, ctx, *parsed)
+
+    @staticmethod
+    def _parse(action: str, args: List[str], data: Dict[str, Any]) -> List[Any]:
+        """Typed handler arguments from the custom_id and selected values; raises if malformed."""
+        if len(args) != ARITY[action]:
+            raise ValueError(f"{action} takes {ARITY[action]} argument(s)")
+        if not args:
+            return []
+        owner = int(args[0])
+        if action == "bucket":
+            return [owner, _bucket_index(data["values"][0])]
+        if action == "dept":
+            dept_up = data["values"][0]
+            if dept_up not in BUCKETS[BUCKET_NAMES[_bucket_index(args[1])]]:
+                raise ValueError(dept_up)
+            return [owner, dept_up]
+        if action == "numbers":
+            if args[1] not in courses.VALID_DEPTS:
+                raise ValueError(args[1])
+            return [owner, args[1]]
+        return [owner]
+
+    # -------------------- checks --------------------
+    @staticmethod
+    async def _reply(interaction: discord.Interaction, text: str) -> None:
+        if interaction.response.is_done():
+            await interaction.edit_original_response(content=text)
+        else:
+            await interaction.response.send_message(text, ephemeral=True)
+
+    @classmethod
+    async def _is_owner(cls, interaction: discord.Interaction, owner: int, what: str = "menu") -> bool:
+        if interaction.user.id != owner:
+            await cls._reply(interaction, f"This {what} isn’t for you.")
+            return False
+        return True
+
+    @classmethod
+    async def _is_student(cls, interaction: discord.Interaction, ctx: GuildContext, what: str = "menu") -> bool:
+        if not interaction.guild:
+            await cls._reply(interaction, f"Use this {what} inside the server.")
+            return False
         member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(
             interaction.user.id
         )
-        if not member or not self._registration.member_has_student(member):
-            await interaction.response.send_message(
-                f"🔒 You need **{self._registration.student_role_name}** role. Register with `/register ...`.",
-                ephemeral=True,
+        if not member or not ctx.registration.member_has_student(member):
+            await cls._reply(
+                interaction,
+                f"🔒 You need **{ctx.registration.student_role_name}** role. Register with `/register ...`.",
             )
+            return False
+        return True
+
+    @staticmethod
+    def _stream(interaction: discord.Interaction) -> ProgressReporter:
+        return ProgressReporter(
+            lambda text: interaction.edit_original_response(content=text),
+            interval=STREAM_EDIT_INTERVAL,
+        )
+
+    # -------------------- registration --------------------
+    async def _verify(self, interaction: discord.Interaction, ctx: GuildContext) -> None:
+        await interaction.response.send_modal(register_modal())
+
+    async def _register(self, interaction: discord.Interaction, ctx: GuildContext) -> None:
+        values = _modal_values(interaction.data.get("components", []))
+        try:
+            async with self._admission.admit(interaction.user.id, on_queued=queue_notice(interaction)):
+                ok, message = await ctx.registration.register_user(
+                    self._bot,
+                    interaction,
+                    values.get("sid", ""),
+                    values.get("email", ""),
+                    values.get("name", ""),
+                )
+        except AdmissionDenied as exc:
+            await self._reply(interaction, str(exc))
+            return
+        prefix = "✅ " if ok else "❌ "
+        await self._reply(interaction, prefix + message)
+
+    # -------------------- enroll panel --------------------
+    async def _enroll(self, interaction: discord.Interaction, ctx: GuildContext) -> None:
+        if not await self._is_student(interaction, ctx, "command"):
             return
         await interaction.response.send_message(
             "Pick a department range first:",
-            view=DeptBucketView(
-                interaction.user,
-                self._registration,
-                self._enrollment,
-                self._store,
-            ),
+            view=bucket_select_view(interaction.user.id),
             ephemeral=True,
         )
 
-    @ui.button(label="Drop courses", style=discord.ButtonStyle.danger)
-    async def drop_courses(self, interaction: discord.Interaction, button: ui.Button) -> None:
-        if not interaction.guild:
-            await interaction.response.send_message("Use this command inside the server.", ephemeral=True)
-            return
-        member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(
-            interaction.user.id
-        )
-        if not member or not self._registration.member_has_student(member):
-            await interaction.response.send_message(
-                f"🔒 You need **{self._registration.student_role_name}** role. Register with `/register ...`.",
-                ephemeral=True,
-            )
+    async def _drop(self, interaction: discord.Interaction, ctx: GuildContext) -> None:
+        if not await self._is_student(interaction, ctx, "command"):
             return
-        slugs = self._store.list_enrollments_for_term(interaction.user.id, state.current_term())
-        if not slugs:
+        keys = ctx.store.list_enrollments_for_term(interaction.user.id, ctx.current_term())
+        if not keys:
             await interaction.response.send_message("You don’t have any courses this term.", ephemeral=True)
             return
         await interaction.response.send_message(
             "Select courses to drop (multi-select):",
-            view=DropMultiSelectView(
-                interaction.user,
-                self._registration,
-                self._enrollment,
-                slugs[:25],
-            ),
+            view=drop_select_view(interaction.user.id, keys),
             ephemeral=True,
         )
 
-
-class DeptBucketView(ui.View):
-    def __init__(
-        self,
-        user: discord.User,
-        registration: RegistrationService,
-        enrollment: EnrollmentService,
-        store: DataStore,
-    ):
-        super().__init__(timeout=120)
-        self.add_item(DeptBucketSelect(user.id, registration, enrollment, store))
-
-
-class DeptBucketSelect(ui.Select):
-    def __init__(
-        self,
-        user_id: int,
-        registration: RegistrationService,
-        enrollment: EnrollmentService,
-        store: DataStore,
-    ):
-        self._user_id = user_id
-        self._registration = registration
-        self._enrollment = enrollment
-        self._store = store
-        options = [discord.SelectOption(label=bucket, value=bucket) for bucket in BUCKETS.keys()]
-        super().__init__(
-            placeholder="Choose range (A–G / H–N / O–Z)",
-            min_values=1,
-            max_values=1,
-            options=options,
-        )
-
-    async def callback(self, interaction: discord.Interaction) -> None:
-        if interaction.user.id != self._user_id:
-            await interaction.response.send_message("This menu isn’t for you.", ephemeral=True)
-            return
-        if not interaction.guild:
-            await interaction.response.send_message("Use this menu inside the server.", ephemeral=True)
-            return
-        member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(
-            interaction.user.id
-        )
-        if not member or not self._registration.member_has_student(member):
-            await interaction.response.send_message(
-                f"🔒 You need **{self._registration.student_role_name}** role. Register with `/register ...`.",
-                ephemeral=True,
-            )
+    async def _bucket(self, interaction: discord.Interaction, ctx: GuildContext, owner: int, bucket: int) -> None:
+        if not await self._is_owner(interaction, owner) or not await self._is_student(interaction, ctx):
             return
-        bucket = self.values[0]
-        depts = BUCKETS[bucket]
         await interaction.response.edit_message(
-            content=f"Pick a department in **{bucket}**:",
-            view=DeptPickView(
-                interaction.user,
-                depts,
-                self._registration,
-                self._enrollment,
-                self._store,
-            ),
+            content=f"Pick a department in **{BUCKET_NAMES[bucket]}**:",
+            view=dept_select_view(interaction.user.id, bucket),
         )
 
-
-class DeptPickView(ui.View):
-    def __init__(
-        self,
-        user: discord.User,
-        depts: List[str],
-        registration: RegistrationService,
-        enrollment: EnrollmentService,
-        store: DataStore,
-    ):
-        super().__init__(timeout=180)
-        self.add_item(DeptPickSelect(user.id, depts, registration, enrollment, store))
-
-
-class DeptPickSelect(ui.Select):
-    def __init__(
-        self,
-        user_id: int,
-        depts: List[str],
-        registration: RegistrationService,
-        enrollment: EnrollmentService,
-        store: DataStore,
-    ):
-        self._user_id = user_id
-        self._registration = registration
-        self._enrollment = enrollment
-        self._store = store
-        options = [discord.SelectOption(label=dept, value=dept) for dept in depts[:25]]
-        super().__init__(placeholder="Select department", min_values=1, max_values=1, options=options)
-
-    async def callback(self, interaction: discord.Interaction) -> None:
-        if interaction.user.id != self._user_id:
-            await interaction.response.send_message("This menu isn’t for you.", ephemeral=True)
-            return
-        if not interaction.guild:
-            await interaction.response.send_message("Use this menu inside the server.", ephemeral=True)
-            return
-        member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(
-            interaction.user.id
-        )
-        if not member or not self._registration.member_has_student(member):
-            await interaction.response.send_message(
-                f"🔒 You need **{self._registration.student_role_name}** role. Register with `/register ...`.",
-                ephemeral=True,
-            )
+    async def _dept(self, interaction: discord.Interaction, ctx: GuildContext, owner: int, dept_up: str) -> None:
+        if not await self._is_owner(interaction, owner) or not await self._is_student(interaction, ctx):
             return
-        dept_up = self.values[0]
-        await interaction.response.send_modal(
-            EnrollNumbersModal(
-                self._user_id,
-                dept_up,
-                self._registration,
-                self._enrollment,
-            )
-        )
+        await interaction.response.send_modal(numbers_modal(interaction.user.id, dept_up))
 
+    # Multi-course handlers acknowledge first (one round trip), then stream
+    # per-course results into the deferred message as each course finishes.
 
-class EnrollNumbersModal(ui.Modal):
-    def __init__(
-        self,
-        user_id: int,
-        dept_up: str,
-        registration: RegistrationService,
-        enrollment: EnrollmentService,
-    ):
-        super().__init__(title="Enroll multiple courses")
-        self._user_id = user_id
-        self._dept_up = dept_up
-        self._registration = registration
-        self._enrollment = enrollment
-        self.numbers = ui.TextInput(
-            label="Course numbers (comma-separated)",
-            placeholder="e.g., 7B, 105, 126",
-            style=discord.TextStyle.short,
-            max_length=200,
-            required=True,
-        )
-        self.add_item(self.numbers)
-
-    async def on_submit(self, interaction: discord.Interaction) -> None:
-        if interaction.user.id != self._user_id:
-            await interaction.response.send_message("This form isn’t for you.", ephemeral=True)
-            return
-        if not interaction.guild:
-            await interaction.response.send_message("Use this form inside the server.", ephemeral=True)
-            return
-        member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(
-            interaction.user.id
-        )
-        if not member or not self._registration.member_has_student(member):
-            await interaction.response.send_message(
-                f"🔒 You need **{self._registration.student_role_name}** role. Register with `/register ...`.",
-                ephemeral=True,
-            )
+    async def _numbers(self, interaction: discord.Interaction, ctx: GuildContext, owner: int, dept_up: str) -> None:
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        if not await self._is_owner(interaction, owner, "form") or not await self._is_student(interaction, ctx, "form"):
             return
-        raw = str(self.numbers.value)
+        raw = _modal_values(interaction.data.get("components", [])).get("numbers", "")
         parts = [p.strip() for p in re.split(r"[,\s]+", raw) if p.strip()]
-        seen, numbers = set(), []
-        for part in parts:
-            normalized = part.upper()
-            if normalized not in seen:
-                seen.add(normalized)
-                numbers.append(normalized)
-            if len(numbers) >= 20:
-                break
-        if not numbers:
-            await interaction.response.send_message("No valid numbers provided.", ephemeral=True)
+        # CourseKey normalises case, so "7b" and "7B" collapse to one course.
+        keys = list(dict.fromkeys(ctx.enrollment.course_key(dept_up, part) for part in parts))[:20]
+        if not keys:
+            await self._reply(interaction, "No valid numbers provided.")
             return
 
-        results = []
-        for number in numbers:
-            ok, msg = await self._enrollment.enroll_one(interaction.guild, interaction.user, self._dept_up, number)
-            results.append(("✅ " if ok else "❌ ") + msg)
-
-        await interaction.response.send_message(
-            f"**Department:** {self._dept_up}\n" + "\n".join(results),
-            ephemeral=True,
-        )
-
-
-class DropMultiSelectView(ui.View):
-    def __init__(
-        self,
-        user: discord.User,
-        registration: RegistrationService,
-        enrollment: EnrollmentService,
-        slugs: List[str],
-    ):
-        super().__init__(timeout=180)
-        self.add_item(DropMultiSelect(user.id, registration, enrollment, slugs))
-
-
-class DropMultiSelect(ui.Select):
-    def __init__(
-        self,
-        user_id: int,
-        registration: RegistrationService,
-        enrollment: EnrollmentService,
-        slugs: List[str],
-    ):
-        self._user_id = user_id
-        self._registration = registration
-        self._enrollment = enrollment
-        options = [discord.SelectOption(label=slug, value=slug) for slug in slugs[:25]]
-        super().__init__(
-            placeholder="Pick one or more courses to drop",
-            min_values=1,
-            max_values=min(25, len(options)),
-            options=options,
-        )
-
-    async def callback(self, interaction: discord.Interaction) -> None:
-        if interaction.user.id != self._user_id:
-            await interaction.response.send_message("This menu isn’t for you.", ephemeral=True)
+        header = f"**Department:** {dept_up}\n"
+        results = [f"⏳ {key.slug}" for key in keys]
+        stream = self._stream(interaction)
+        await stream.update(header + "\n".join(results))
+        position = {key: i for i, key in enumerate(keys)}
+
+        async def on_result(key: CourseKey, ok: bool, msg: str) -> None:
+            results[position[key]] = ("✅ " if ok else "❌ ") + msg
+            await stream.update(header + "\n".join(results))
+
+        # A double-submitted form shares the first run; fill in from its outcomes.
+        try:
+            async with self._admission.admit(interaction.user.id, cost=len(keys), on_queued=queue_notice(interaction)):
+                outcomes = await ctx.enrollment.enroll_many(
+                    interaction.guild, interaction.user, keys, on_result=on_result
+                )
+        except AdmissionDenied as exc:
+            await stream.update(str(exc), final=True)
             return
-        if not interaction.guild:
-            await interaction.response.send_message("Use this menu inside the server.", ephemeral=True)
+        for key, ok, msg in outcomes:
+            results[position[key]] = ("✅ " if ok else "❌ ") + msg
+        await stream.update(header + "\n".join(results), final=True)
+
+    async def _dropsel(self, interaction: discord.Interaction, ctx: GuildContext, owner: int) -> None:
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        if not await self._is_owner(interaction, owner) or not await self._is_student(interaction, ctx):
             return
-        member = interaction.guild.get_member(interaction.user.id) or await interaction.guild.fetch_member(
-            interaction.user.id
-        )
-        if not member or not self._registration.member_has_student(member):
-            await interaction.response.send_message(
-                f"🔒 You need **{self._registration.student_role_name}** role. Register with `/register ...`.",
-                ephemeral=True,
-            )
+        values: List[str] = interaction.data.get("values", [])
+        chosen = [key for key in map(CourseKey.parse, values) if key is not None]
+        lines = [f"⏳ {key.slug}" for key in chosen]
+        position = {key: i for i, key in enumerate(chosen)}
+        stream = self._stream(interaction)
+        await stream.update("\n".join(lines) or "Nothing to drop.")
+
+        async def on_result(key: CourseKey, ok: bool, detail: str) -> None:
+            lines[position[key]] = f"✅ Dropped {detail}" if ok else f"❌ {detail}"
+            await stream.update("\n".join(lines))
+
+        try:
+            async with self._admission.admit(interaction.user.id, cost=len(chosen), on_queued=queue_notice(interaction)):
+                ok, fail = await ctx.enrollment.drop_many(
+                    interaction.guild, interaction.user, chosen, on_result=on_result
+                )
+        except AdmissionDenied as exc:
+            await stream.update(str(exc), final=True)
             return
-        chosen = list(self.values)
-        ok, fail = await self._enrollment.drop_many(interaction.guild, interaction.user, chosen)
         responses = []
         if ok:
-            responses.append("✅ Dropped:\n- " + "\n- ".join(ok))
+            responses.append("✅ Dropped:\n- " + "\n- ".join(key.slug for key in ok))
         if fail:
             responses.append("❌ Failed:\n- " + "\n- ".join(fail))
         text = "\n".join(responses) if responses else "Nothing to drop."
-        await interaction.response.send_message(text, ephemeral=True)
+        await stream.update(text, final=True)
@@ -0,0 +1,50 @@
+"""Command-line reader for the enrollment event stream."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+
+from berkeley_bot.config import load_config
+from berkeley_bot.events import EventConsumer, EventLog
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print enrollment events as NDJSON.")
+    parser.add_argument("--consumer", help="Consumer name; resumes from and commits its offset")
+    parser.add_argument("--offset", type=int, help="Start at this offset instead of the committed one")
+    parser.add_argument("--guild", type=int, help="Guild id (defaults to GUILD_ID)")
+    parser.add_argument("-f", "--follow", action="store_true", help="Keep waiting for new events")
+    parser.add_argument("--interval", type=float, default=1.0, help="Poll interval with --follow")
+    args = parser.parse_args()
+
+    config = load_config(require_token=False)
+    guild = config.guild(args.guild) if args.guild else config.primary
+    if guild is None:
+        parser.error(f"guild {args.guild} is not configured")
+    consumer = EventConsumer(EventLog(guild.paths.events_dir, guild_id=guild.guild_id), args.consumer or "tail")
+    if args.offset is not None:
+        consumer.seek(args.offset)
+    elif not args.consumer:
+        consumer.seek(0)
+
+    try:
+        while True:
+            events = consumer.poll()
+            for event in events:
+                sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+            if events and args.consumer:
+                consumer.commit()
+            if not events:
+                if not args.follow:
+                    break
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Command-line roster export for the Berkeley enrollment bot."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+from berkeley_bot.config import load_config
+from berkeley_bot.export import FORMATS, iter_enrollment_rows, iter_export
+from berkeley_bot.storage import DataStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream enrollments joined with student names.")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--term", help="Only this term, e.g. fa25")
+    parser.add_argument("--dept", help="Only this department, e.g. CS")
+    parser.add_argument("--guild", type=int, help="Guild id (defaults to GUILD_ID)")
+    parser.add_argument("-o", "--output", help="Write to a file instead of stdout")
+    args = parser.parse_args()
+
+    config = load_config(require_token=False)
+    guild = config.guild(args.guild) if args.guild else config.primary
+    if guild is None:
+        parser.error(f"guild {args.guild} is not configured")
+    store = DataStore(guild.paths, binary_index=guild.binary_index)
+
+    rows = iter_enrollment_rows(store, term=args.term, dept=args.dept)
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in iter_export(rows, args.format):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Summarise a tracing NDJSON file: the slowest commands and the spans behind them."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+
+def iter_spans(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line if the bot was killed mid-write.
+                continue
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarise(path: str, *, top: int, command: Optional[str]) -> str:
+    roots: Dict[str, List[float]] = defaultdict(list)
+    children: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    errors: Dict[str, int] = defaultdict(int)
+    for span in iter_spans(path):
+        root = span.get("root", "?")
+        if command and root != command:
+            continue
+        duration = float(span.get("duration_ms", 0.0))
+        if span.get("parent_id") is None:
+            roots[root].append(duration)
+            if span.get("error"):
+                errors[root] += 1
+        else:
+            children[root][span.get("name", "?")].append(duration)
+
+    lines: List[str] = []
+    ranked = sorted(roots.items(), key=lambda item: percentile(item[1], 95), reverse=True)
+    for root, durations in ranked:
+        lines.append(
+            f"{root}  n={len(durations)}  p50={percentile(durations, 50):.1f}ms  "
+            f"p95={percentile(durations, 95):.1f}ms  max={max(durations):.1f}ms  errors={errors[root]}"
+        )
+        spans = sorted(children[root].items(), key=lambda item: sum(item[1]), reverse=True)[:top]
+        for name, values in spans:
+            lines.append(
+                f"    {name:<48} n={len(values):<5} total={sum(values):9.1f}ms  "
+                f"p95={percentile(values, 95):8.1f}ms  max={max(values):8.1f}ms"
+            )
+        lines.append("")
+    return "\n".join(lines) if lines else "No traces found.\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Slowest spans per command from a trace file.")
+    parser.add_argument("file", nargs="?", default="traces.ndjson")
+    parser.add_argument("--top", type=int, default=10, help="Spans listed per command")
+    parser.add_argument("--command", help="Only this root, e.g. /enroll or component:numbers")
+    args = parser.parse_args()
+    try:
+        sys.stdout.write(summarise(args.file, top=args.top, command=args.command))
+    except FileNotFoundError:
+        parser.error(f"{args.file} does not exist")
+
+
+if __name__ == "__main__":
+    main()